@@ -0,0 +1,56 @@
+import argparse
+import time
+from pathlib import Path
+
+import sys
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+from src.grounding.nms import batched_nms_xyxy, NMS_TORCH_MIN_BOXES
+
+
+def _random_boxes(n: int, n_classes: int, rng, size: float = 1024.0):
+    xy = rng.uniform(0, size * 0.9, (n, 2))
+    wh = rng.uniform(size * 0.02, size * 0.3, (n, 2))
+    boxes = np.concatenate([xy, np.minimum(xy + wh, size)], axis=1).astype(np.float32)
+    scores = rng.random(n).astype(np.float32)
+    idxs = rng.integers(0, n_classes, n)
+    return boxes, scores, idxs
+
+
+def _time(fn, repeat: int):
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        res = fn()
+    return (time.perf_counter() - t0) / repeat * 1e6, res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmark: batched NMS, NumPy vs torchvision")
+    ap.add_argument("--sizes", default="4,16,64,256,1024,4096")
+    ap.add_argument("--classes", type=int, default=3)
+    ap.add_argument("--iou", type=float, default=0.5)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"auto switches to torchvision at N >= {NMS_TORCH_MIN_BOXES}")
+    print(f"{'N':>6} | {'numpy (us)':>11} | {'torch (us)':>11} | kept | match")
+    mismatches = 0
+    for n in [int(x) for x in args.sizes.split(",")]:
+        boxes, scores, idxs = _random_boxes(n, args.classes, rng)
+        t_np, k_np = _time(lambda: batched_nms_xyxy(boxes, scores, idxs, args.iou, backend="numpy"), args.repeat)
+        t_th, k_th = _time(lambda: batched_nms_xyxy(boxes, scores, idxs, args.iou, backend="torch"), args.repeat)
+        match = sorted(k_np) == sorted(k_th)
+        mismatches += not match
+        print(f"{n:>6} | {t_np:>11.1f} | {t_th:>11.1f} | {len(k_np):>4} | {'ok' if match else 'MISMATCH'}")
+    if mismatches:
+        raise SystemExit(f"{mismatches} size(s) kept different indices")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import time
+from pathlib import Path
+
+import sys
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.grounding.models import (
+    load_grounding_cfg, try_load_groundingdino, try_load_sam, try_load_groundingdino_onnx, try_load_sam_onnx,
+)
+from src.grounding.preprocess import prepare_inputs
+
+
+def _load_yaml(path: str) -> dict:
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def _time(fn, repeat: int, *args):
+    out = fn(*args)  # warm-up
+    t = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        t.append(time.perf_counter() - t0)
+    return float(np.median(t)) * 1000.0, out
+
+
+def _dino(model, image, caption):
+    with torch.no_grad():
+        out = model(image[None], captions=[caption])
+    return out["pred_logits"].sigmoid().numpy(), out["pred_boxes"].numpy()
+
+
+def _sam(predictor, rgb_np, box):
+    predictor.set_image(rgb_np)
+    masks, scores, _ = predictor.predict(box=box, multimask_output=False)
+    return masks, scores
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Latency benchmark: eager PyTorch vs onnxruntime (CPU) grounding")
+    ap.add_argument("--config", default="configs/grounding.yaml")
+    ap.add_argument("--image", default=str(ROOT / "assets" / "sample.jpeg"))
+    ap.add_argument("--caption", default="car . person .")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    gcfg = load_grounding_cfg(_load_yaml(args.config))
+    img = Image.open(args.image)
+    inputs = prepare_inputs(img)
+    W, H = img.size
+    box = np.array([W * 0.25, H * 0.25, W * 0.75, H * 0.75], dtype=np.float32)
+    torch.set_grad_enabled(False)
+
+    eager_dino, err = try_load_groundingdino(gcfg.dino, "cpu")
+    onnx_dino, err_onnx = try_load_groundingdino_onnx(gcfg.dino, gcfg.onnx)
+    if eager_dino is None or onnx_dino is None:
+        sys.exit(err or err_onnx)
+    t_e, (lg_e, bx_e) = _time(_dino, args.repeat, eager_dino, inputs.dino, args.caption)
+    t_o, (lg_o, bx_o) = _time(_dino, args.repeat, onnx_dino, inputs.dino, args.caption)
+    print(f"image {img.size}, CPU, median of {args.repeat}")
+    print(f"  GroundingDINO  eager {t_e:9.1f} ms | onnx {t_o:9.1f} ms (x{t_e / max(t_o, 1e-9):.2f}) | "
+          f"max |logit diff| {np.abs(lg_e - lg_o).max():.2e}, max |box diff| {np.abs(bx_e - bx_o).max():.2e}")
+    del eager_dino, onnx_dino  # free the detectors before loading SAM
+
+    _, eager_pred, err = try_load_sam(gcfg.sam, "cpu")
+    _, onnx_pred, err_onnx = try_load_sam_onnx(gcfg.sam, gcfg.onnx)
+    if eager_pred is None or onnx_pred is None:
+        sys.exit(err or err_onnx)
+    t_e, (m_e, _) = _time(_sam, args.repeat, eager_pred, inputs.rgb_np, box)
+    t_o, (m_o, _) = _time(_sam, args.repeat, onnx_pred, inputs.rgb_np, box)
+    iou = (m_e & m_o).sum() / max((m_e | m_o).sum(), 1)
+    print(f"  SAM (enc+dec)  eager {t_e:9.1f} ms | onnx {t_o:9.1f} ms (x{t_e / max(t_o, 1e-9):.2f}) | "
+          f"mask IoU {iou:.4f}")
+
+
+if __name__ == "__main__":
+    main()
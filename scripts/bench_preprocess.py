@@ -0,0 +1,64 @@
+import argparse
+import time
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+import sys
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+from PIL import Image
+from groundingdino.util.inference import load_image
+
+from src.grounding.preprocess import prepare_inputs
+
+
+def _legacy(img: Image.Image):
+    """Former locate_plan_aware path: temp JPEG + load_image, then a second RGB conversion for SAM."""
+    with NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
+        img.convert("RGB").save(tmp.name, "JPEG")
+        temp_path = tmp.name
+    _, tensor = load_image(temp_path)
+    image_np = np.array(img.convert("RGB"))
+    Path(temp_path).unlink()  # the old path leaked it; don't let the benchmark fill /tmp
+    return tensor, image_np
+
+
+def _in_memory(img: Image.Image):
+    inputs = prepare_inputs(img)
+    return inputs.dino, inputs.rgb_np
+
+
+def _time(fn, img, repeat: int) -> float:
+    fn(img)  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(img)
+    return (time.perf_counter() - t0) / repeat * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmark: GroundingDINO/SAM input preprocessing")
+    ap.add_argument("--image", default=str(ROOT / "assets" / "sample.jpeg"))
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    img = Image.open(args.image)
+    img.load()
+    t_old = _time(_legacy, img, args.repeat)
+    t_new = _time(_in_memory, img, args.repeat)
+
+    old_tensor, _ = _legacy(img)
+    new_tensor, _ = _in_memory(img)
+    # Differences only come from the JPEG re-encode of the old path
+    diff = float((old_tensor - new_tensor).abs().mean()) if old_tensor.shape == new_tensor.shape else float("nan")
+
+    print(f"image {img.size}, repeat={args.repeat}")
+    print(f"  temp-JPEG + load_image : {t_old:8.2f} ms")
+    print(f"  in-memory              : {t_new:8.2f} ms  (x{t_old / max(t_new, 1e-9):.2f})")
+    print(f"  mean |tensor diff|     : {diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
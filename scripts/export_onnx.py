@@ -0,0 +1,42 @@
+import argparse
+from pathlib import Path
+
+import sys
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.grounding.models import load_grounding_cfg, try_load_groundingdino, try_load_sam
+from src.grounding.onnx_backend import dino_onnx_path, sam_onnx_paths, export_dino, export_sam
+
+
+def _load_yaml(path: str) -> dict:
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export GroundingDINO and SAM (encoder + decoder) to ONNX "
+                                             "for grounding.backend: onnx")
+    ap.add_argument("--config", default="configs/grounding.yaml")
+    ap.add_argument("--only", choices=["dino", "sam"], default=None)
+    args = ap.parse_args()
+
+    gcfg = load_grounding_cfg(_load_yaml(args.config))
+    if args.only in (None, "dino"):
+        model, err = try_load_groundingdino(gcfg.dino, "cpu")
+        if model is None:
+            sys.exit(err)
+        path = export_dino(model, model.tokenizer, dino_onnx_path(gcfg.dino, gcfg.onnx), model.max_text_len)
+        print(f"GroundingDINO -> {path}")
+    if args.only in (None, "sam"):
+        sam, _, err = try_load_sam(gcfg.sam, "cpu")
+        if sam is None:
+            sys.exit(err)
+        enc, dec = sam_onnx_paths(gcfg.sam, gcfg.onnx)
+        export_sam(sam, enc, dec)
+        print(f"SAM encoder -> {enc}\nSAM decoder -> {dec}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 # scripts/ground_debug.py
 import argparse, json
 from pathlib import Path
-from src.utils.run_io import make_run_dir, load_image, save_image
+from src.utils.run_io import make_run_dir, save_image
 from src.grounding.locate import locate_plan_aware
+from src.grounding.masks import grounding_to_json
+from src.utils.image_context import ImageContext
 
 def _load_yaml(path: str) -> dict:
     p = Path(path)
@@ -25,8 +27,8 @@ def main():
     run_dir = make_run_dir(tag=args.tag)
     art = run_dir / "artifacts"
 
-    img = load_image(args.image)
-    save_image(img, art / "input.jpg")
+    img = ImageContext.open(args.image)
+    save_image(img.rgb, art / "input.jpg")
 
     plan = _load_plan_json(args.plan)
     # convert dict → Plan (lazy import to avoid pydantic here)
@@ -36,7 +38,7 @@ def main():
     g_cfg = _load_yaml("configs/grounding.yaml")
     out = locate_plan_aware(img, plan, g_cfg, save_debug_dir=art)
 
-    (art / "grounding.json").write_text(json.dumps(out, indent=2, default=str))
+    (art / "grounding.json").write_text(json.dumps(grounding_to_json(out), indent=2, default=str))
     print(f"\nSee artifacts in: {run_dir}\n")
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import argparse
 from pathlib import Path
-from PIL import Image
 
 import sys
 ROOT = Path(__file__).resolve().parent.parent
@@ -8,7 +7,9 @@ sys.path.insert(0, str(ROOT))
 
 # --- Local imports ---
 from src.utils.run_io import make_run_dir, save_image, save_json
+from src.utils.image_context import ImageContext
 from src.grounding.locate import locate_plan_aware
+from src.grounding.masks import grounding_to_json
 from src.validators.dummy import validate_dummy
 from src.verifiers.dummy import verify_dummy
 from src.editors.edit_manager import EditManager
@@ -64,7 +65,9 @@ def main():
     if not img_path.exists():
         raise FileNotFoundError(f"Image not found: {img_path.resolve()}")
     try:
-        img = Image.open(img_path).convert("RGB")
+        # decoded once; grounding, debug drawings and the editors share its conversions / resizes
+        ctx = ImageContext.open(img_path)
+        img = ctx.rgb
         print(f"[INFO] Loaded image: {img.size}, mode={img.mode}")
     except Exception as e:
         raise RuntimeError(f"Failed to open image: {img_path} — {e}")
@@ -77,22 +80,19 @@ def main():
     print(f"[INFO] Plan generated for instruction: '{args.instruction}'")
 
     # --- 3) Ground objects (GroundingDINO + SAM) ---
-    g_out = locate_plan_aware(img, plan, cfg_ground, save_debug_dir=art)
-    save_json(
-        {"meta": g_out.get("meta", {}), "targets": [
-            {k: (v if k != "masks" else "<bool array>") for k, v in t.items()}
-            for t in g_out["targets"]
-        ]},
-        art / "grounding.json",
-    )
+    g_out = locate_plan_aware(ctx, plan, cfg_ground, save_debug_dir=art)
     print("[INFO] Grounding completed")
 
     # --- 4) Perform real editing (InstructPix2Pix / Add-It) ---
     editor = EditManager(cfg_models)
-    edited = editor.apply_edit(img, plan, g_out)
+    edited = editor.apply_edit(ctx, plan, g_out)
     save_image(edited, art / "edited.jpg")
     print("[INFO] Image edited successfully")
 
+    # masks are stored as RLE: grounding_from_json() reloads them without re-running SAM.
+    # Written after editing so that lazy SAM masks hold what the editor read and no more
+    save_json(grounding_to_json(g_out), art / "grounding.json")
+
     # --- 5) Validate and verify results (placeholders) ---
     report = validate_dummy(img, edited, plan)
     verdict = verify_dummy(plan)
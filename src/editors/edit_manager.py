@@ -1,14 +1,19 @@
 # src/editors/edit_manager.py
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from PIL import Image
 import numpy as np
 import torch
 
+from src.utils.image_context import ImageContext
 from .real_editors import (
-    load_instructpix2pix, load_addit,
-    run_instructpix2pix, run_addit
+    run_instructpix2pix, run_addit, run_instructpix2pix_batch, run_addit_batch, _editor_input,
 )
+from .pipeline_registry import get_pipeline_registry
+from .roi import roi_window, feather, paste_back
+from .placement import plan_placement
+from .prompt_cache import get_prompt_cache
+from .latent_cache import SourceLatentCache
 
 class EditManager:
     def __init__(self, cfg: Dict[str, Any]):
@@ -16,29 +21,112 @@ class EditManager:
         self.mode = cfg["models"]["editor"].get("mode", "auto")
         self.pipes = {"instruct": None, "addit": None}
         self.cfg = cfg
+        # pipelines (and their shared VAE / text encoder) outlive this manager
+        self.registry = get_pipeline_registry(cfg["models"].get("share_components", "auto"))
+        self.last_placement: Dict[str, Any] | None = None  # regions used by the last add
+        pc = cfg["models"]["editor"].get("prompt_cache") or {}
+        self.prompt_cache = get_prompt_cache(pc.get("max_mb", 64)) if pc.get("enabled", True) else None
+        lc = cfg["models"]["editor"].get("latent_cache") or {}
+        self.latent_cache = SourceLatentCache(lc.get("items", 16)) if lc.get("enabled", True) else None
 
     def _get_instruct_pipe(self):
         if self.pipes["instruct"] is None:
             m = self.cfg["models"]["instructpix2pix"]
-            self.pipes["instruct"] = load_instructpix2pix(m["name"], self.device, m.get("use_fp16", True))
+            self.pipes["instruct"] = self.registry.instructpix2pix(m["name"], self.device, m.get("use_fp16", True))
         return self.pipes["instruct"]
 
     def _get_addit_pipe(self):
         if self.pipes["addit"] is None:
             m = self.cfg["models"]["addit"]
-            self.pipes["addit"] = load_addit(m["base_model"], m["controlnet"], self.device, m.get("use_fp16", True))
+            self.pipes["addit"] = self.registry.addit(m["base_model"], m["controlnet"], self.device, m.get("use_fp16", True))
         return self.pipes["addit"]
 
-    def apply_edit(self, img: Image.Image, plan, grounding_info) -> Image.Image:
+    def memory_report(self) -> Dict[str, Any]:
+        """Resident editor parameters (MB), shared components counted once, and prompt / latent cache hits."""
+        stats = self.registry.stats()
+        if self.prompt_cache is not None:
+            stats["prompt_cache"] = self.prompt_cache.stats()
+        if self.latent_cache is not None:
+            stats["latent_cache"] = self.latent_cache.stats()
+        return stats
+
+    def apply_edit(self, img: Image.Image | ImageContext, plan, grounding_info) -> Image.Image:
         """
         grounding_info = locate_plan_aware(...) output
+        img may be the request's ImageContext (resized editor inputs are then shared)
+        With models.editor.roi.enabled, remove / recolor / replace edit a crop around the
+        target mask and return the full-resolution image; with models.editor.placement.enabled
+        an add inpaints only the regions placed for its instances (cropped the same way).
+        """
+        ctx = ImageContext.of(img)
+        job = self._prepare(ctx, plan, grounding_info)
+        if job["editor"] is None:
+            return ctx.rgb
+        window = job["window"]
+        if window is None:
+            return self._run(job["editor"], ctx, job["mask"], plan.instruction)
+        edited = self._run(job["editor"], self._crop_input(ctx, window), job["crop_mask"], plan.instruction)
+        return self._paste(ctx, edited, job)
+
+    def apply_edits(self, img: Image.Image | ImageContext, plans: List[Any],
+                    grounding: Dict[str, Any] | List[Dict[str, Any]]) -> List[Image.Image]:
         """
+        One edited image per plan, in order. grounding is one locate_plan_aware output
+        shared by all plans, or one per plan.
+
+        Plans that use the same editor on the same input (the whole frame, or the same
+        ROI crop) run as one batched diffusion call with per-sample prompts and masks,
+        the source image being encoded once. Batches are split to stay under
+        models.editor.batch (max_batch samples, max_megapixels of editor input per call).
+        """
+        ctx = ImageContext.of(img)
+        if isinstance(grounding, dict):
+            grounding = [grounding] * len(plans)
+        jobs = [self._prepare(ctx, p, g) for p, g in zip(plans, grounding)]
+
+        out: List[Optional[Image.Image]] = [None] * len(plans)
+        groups: Dict[tuple, List[int]] = {}
+        for i, job in enumerate(jobs):
+            if job["editor"] is None:
+                out[i] = ctx.rgb
+            else:
+                groups.setdefault((job["editor"], job["window"]), []).append(i)
+
+        for (editor, window), idx in groups.items():
+            source = ctx if window is None else self._crop_input(ctx, window)
+            masks = [jobs[i]["mask"] if window is None else jobs[i]["crop_mask"] for i in idx]
+            prompts = [plans[i].instruction for i in idx]
+            if len(idx) == 1:
+                edited = [self._run(editor, source, masks[0], prompts[0])]
+            else:
+                edited = self._run_batched(editor, source, masks, prompts)
+            for i, e in zip(idx, edited):
+                out[i] = e if window is None else self._paste(ctx, e, jobs[i])
+        return out
+
+    def _prepare(self, ctx: ImageContext, plan, grounding_info) -> Dict[str, Any]:
+        """Editor, inpainting mask and ROI window for one plan."""
         op = plan.ops[0].type if plan.ops else "unknown"
         
         # Determine the appropriate mask based on operation type
         mask = None
         
-        if op == "add":
+        placed = False
+        if op == "add" and self._placement_cfg().get("enabled", False):
+            # Compact per-instance regions from plan.relations, the reference box and Target.count
+            pc = self._placement_cfg()
+            mask, self.last_placement = plan_placement(
+                plan, grounding_info, ctx.size,
+                gap=float(pc.get("gap", 0.05)), scale=float(pc.get("scale", 1.0)),
+            )
+            if self.last_placement["shortfall"] > 0:
+                print(f"[INFO] Placement: no room for {self.last_placement['shortfall']} of "
+                      f"{self.last_placement['count']} '{self.last_placement['target']}'")
+            placed = bool(mask.any())
+            if not placed:
+                mask = None
+
+        if op == "add" and not placed:
             # For ADD operations: find the reference object (not the object to add)
             # The first target is typically the object to add, find other targets for reference
             reference_mask = None
@@ -65,17 +153,78 @@ class EditManager:
             if grounding_info["targets"] and grounding_info["targets"][0].get("masks") is not None:
                 mask = grounding_info["targets"][0]["masks"][0]
 
+        editor = self._editor_for(op)
+        if editor is None:
+            if self.mode == "FlowEdit":
+                print("[INFO] EditManager mode is 'FlowEdit' - returning original image (not implemented)")
+            return {"editor": None, "mask": None, "window": None}
+
+        # ROI mode: diffuse only a padded crop around the target, blend it back into
+        # the full-resolution original (pixels outside the feathered mask stay as they were)
+        window = self._roi_window(op, mask, placed)
+        job = {"editor": editor, "mask": mask, "window": window}
+        if window is not None:
+            x0, y0, x1, y1 = window
+            job["crop_mask"] = np.asarray(mask, dtype=bool)[y0:y1, x0:x1]
+        return job
+
+    def _crop_input(self, ctx: ImageContext, window) -> Image.Image:
+        # Editor input for a ROI crop, upscaled to the models' native resolution (SD 1.x: 512):
+        # they degrade well below it. paste_back scales the result down to the window again
+        return _editor_input(ctx.crop(window), min_side=int(self._roi_cfg().get("native_side", 512)))
+
+    def _paste(self, ctx: ImageContext, edited: Image.Image, job: Dict[str, Any]) -> Image.Image:
+        alpha = feather(job["crop_mask"], int(self._roi_cfg().get("feather", 8)))
+        return paste_back(ctx.rgb_np, edited, job["window"], alpha)
+
+    def _editor_for(self, op: str) -> Optional[str]:
         # Decide model
         if self.mode == "instructpix2pix" or (self.mode == "auto" and op in ["recolor", "replace", "move"]):
-            pipe = self._get_instruct_pipe()
-            prompt = plan.instruction
-            return run_instructpix2pix(pipe, img, prompt)
-        elif self.mode == "addit" or (self.mode == "auto" and op in ["add", "remove"]):
-            pipe = self._get_addit_pipe()
-            prompt = plan.instruction
-            return run_addit(pipe, img, mask, prompt)
-        elif self.mode == "FlowEdit":
-            print("[INFO] EditManager mode is 'FlowEdit' - returning original image (not implemented)")
-            return img
-        else:
-            return img  
+            return "instruct"
+        if self.mode == "addit" or (self.mode == "auto" and op in ["add", "remove"]):
+            return "addit"
+        return None
+
+    def _run(self, editor: str, image, mask, prompt: str) -> Image.Image:
+        if editor == "instruct":
+            return run_instructpix2pix(self._get_instruct_pipe(), image, prompt,
+                                       prompt_cache=self.prompt_cache, latent_cache=self.latent_cache)
+        return run_addit(self._get_addit_pipe(), image, mask, prompt, prompt_cache=self.prompt_cache)
+
+    def _run_batched(self, editor: str, source: ImageContext, masks: List[Any], prompts: List[str]) -> List[Image.Image]:
+        """Sub-batches sized by models.editor.batch; halved again on a CUDA out-of-memory error."""
+        b = self.cfg["models"]["editor"].get("batch") or {}
+        w, h = _editor_input(source).size
+        per_call = int(float(b.get("max_megapixels", 2.5)) * 1e6 // (w * h))
+        n = max(1, min(int(b.get("max_batch", 8)), per_call))
+        out: List[Image.Image] = []
+        i = 0
+        while i < len(prompts):
+            try:
+                if editor == "instruct":
+                    out += run_instructpix2pix_batch(self._get_instruct_pipe(), source, prompts[i:i + n],
+                                                     prompt_cache=self.prompt_cache, latent_cache=self.latent_cache)
+                else:
+                    out += run_addit_batch(self._get_addit_pipe(), source, masks[i:i + n], prompts[i:i + n],
+                                           prompt_cache=self.prompt_cache)
+                i += n
+            except torch.cuda.OutOfMemoryError:
+                if n == 1:
+                    raise
+                torch.cuda.empty_cache()
+                n = max(1, n // 2)
+        return out
+
+    def _roi_cfg(self) -> Dict[str, Any]:
+        return self.cfg["models"]["editor"].get("roi") or {}
+
+    def _placement_cfg(self) -> Dict[str, Any]:
+        return self.cfg["models"]["editor"].get("placement") or {}
+
+    def _roi_window(self, op: str, mask, placed: bool = False):
+        """Crop window for ROI editing, or None for a whole-frame edit."""
+        r = self._roi_cfg()
+        # an add without placement inpaints around (not on) the reference: nothing to crop to
+        if not r.get("enabled", False) or mask is None or (op not in ("remove", "recolor", "replace") and not placed):
+            return None
+        return roi_window(np.asarray(mask, dtype=bool), float(r.get("pad", 0.25)), int(r.get("min_side", 256)))
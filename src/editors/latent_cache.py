@@ -0,0 +1,64 @@
+# src/editors/latent_cache.py
+from __future__ import annotations
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+import torch
+from PIL import Image
+
+from .real_editors import encode_source
+
+
+class SourceLatentCache:
+    """
+    LRU of VAE-encoded source images, at most *max_items* entries.
+
+    Keyed by (image content hash, resolution, VAE, device, dtype), so sweeps and
+    multi-instruction sessions on one image encode it once per editor resolution.
+    VAEs are keyed by object id, and each entry holds a weak reference to its VAE: after
+    a registry clear or a reload, an id reused by another VAE is a miss, not a stale hit.
+    """
+
+    def __init__(self, max_items: int = 16):
+        self.max_items = int(max_items)
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[tuple, Tuple[weakref.ref, torch.Tensor]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(pipe, img_rgb: Image.Image) -> tuple:
+        digest = hashlib.blake2b(img_rgb.tobytes(), digest_size=16).hexdigest()
+        vae = pipe.vae
+        return (digest, img_rgb.mode, img_rgb.size, id(vae), str(vae.device), str(vae.dtype))
+
+    def get(self, pipe, img_rgb: Image.Image) -> torch.Tensor:
+        """[1, 4, h/8, w/8] latent of *img_rgb* (the editor input) with *pipe*'s VAE."""
+        k = self.key(pipe, img_rgb)
+        with self._lock:
+            entry = self._items.get(k)
+            if entry is not None:
+                vae, lat = entry
+                if vae() is pipe.vae:
+                    self._items.move_to_end(k)
+                    self.hits += 1
+                    return lat
+                del self._items[k]  # id reused by a new VAE
+            self.misses += 1
+        lat = encode_source(pipe, img_rgb)
+        with self._lock:
+            self._items[k] = (weakref.ref(pipe.vae), lat)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return lat
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "items": len(self._items)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,189 @@
+# src/editors/pipeline_registry.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .real_editors import load_instructpix2pix, load_addit, _dtype
+from .prompt_cache import clear_prompt_cache
+
+# Components both editor pipelines carry; shared when their weights are identical
+SHARED_KINDS = ("vae", "text_encoder", "tokenizer")
+
+
+class PipelineRegistry:
+    """
+    Process-wide cache of editor pipelines and of the components they can share.
+
+    Each pipeline is loaded once per (model, device, dtype). Before loading one, its
+    VAE, text encoder and tokenizer are looked up by content fingerprint (config +
+    weight checksums): InstructPix2Pix and SD-inpainting ship the same SD 1.x VAE and
+    CLIP text encoder, so the second pipeline reuses the first one's modules instead
+    of holding its own copy.
+
+    share: "auto" (share only on matching weight checksums), "force" (matching config
+    is enough, for offline use) or "off".
+    """
+
+    def __init__(self, share: str = "auto"):
+        self.share = share
+        self._pipes: Dict[Tuple, Any] = {}
+        self._components: Dict[Tuple, Any] = {}
+        self._owners: Dict[Tuple, List[str]] = {}
+        self._lock = threading.RLock()
+
+    # --- pipelines ---
+
+    def instructpix2pix(self, name: str, device: str, use_fp16: bool = True):
+        key = ("instructpix2pix", name, str(device), str(_dtype(use_fp16)))
+        return self._pipeline(key, name, device, use_fp16,
+                              lambda parts: load_instructpix2pix(name, device, use_fp16, **parts))
+
+    def addit(self, base_model: str, controlnet: str, device: str, use_fp16: bool = True):
+        key = ("addit", base_model, controlnet, str(device), str(_dtype(use_fp16)))
+        return self._pipeline(key, base_model, device, use_fp16,
+                              lambda parts: load_addit(base_model, controlnet, device, use_fp16, **parts))
+
+    def _pipeline(self, key: Tuple, repo: str, device: str, use_fp16: bool, loader: Callable[[Dict[str, Any]], Any]):
+        with self._lock:
+            if key not in self._pipes:
+                parts = {kind: self._component(kind, repo, device, use_fp16, owner=key[0]) for kind in SHARED_KINDS}
+                self._pipes[key] = loader({k: v for k, v in parts.items() if v is not None})
+            return self._pipes[key]
+
+    # --- shared components ---
+
+    def _component(self, kind: str, repo: str, device: str, use_fp16: bool, owner: str):
+        """Shared module for *kind* of *repo*, or None to let the pipeline load its own."""
+        if self.share == "off":
+            return None
+        fp = _fingerprint(repo, kind, trust_config=self.share == "force")
+        if fp is None:
+            return None
+        ckey = (kind, fp, str(device), str(_dtype(use_fp16)))
+        if ckey not in self._components:
+            self._components[ckey] = _load_component(kind, repo, device, use_fp16)
+            self._owners[ckey] = []
+        self._owners[ckey].append(owner)
+        return self._components[ckey]
+
+    # --- reporting ---
+
+    def stats(self) -> Dict[str, Any]:
+        """Resident parameter memory: per pipeline, and in total with shared tensors counted once."""
+        with self._lock:
+            seen: Dict[int, int] = {}
+            pipes = {}
+            for key, pipe in self._pipes.items():
+                own = 0
+                for module in _modules(pipe):
+                    for p in list(module.parameters()) + list(module.buffers()):
+                        nbytes = p.numel() * p.element_size()
+                        own += nbytes
+                        seen[p.data_ptr()] = nbytes
+                pipes["|".join(key)] = {"param_mb": round(own / 2**20, 1)}
+            shared = {f"{k[0]}:{k[1][:12]}": v for k, v in self._owners.items() if len(v) > 1}
+            separate = sum(v["param_mb"] for v in pipes.values())
+            resident = round(sum(seen.values()) / 2**20, 1)
+            return {"pipelines": pipes, "shared": shared, "resident_mb": resident,
+                    "saved_mb": round(separate - resident, 1)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pipes.clear()
+            self._components.clear()
+            self._owners.clear()
+        clear_prompt_cache()  # its entries belong to the text encoders just dropped
+
+
+def _modules(pipe) -> List[Any]:
+    import torch
+    return [m for m in getattr(pipe, "components", {}).values() if isinstance(m, torch.nn.Module)]
+
+
+def _load_component(kind: str, repo: str, device: str, use_fp16: bool):
+    if kind == "tokenizer":
+        from transformers import CLIPTokenizer
+        return CLIPTokenizer.from_pretrained(repo, subfolder="tokenizer")
+    if kind == "vae":
+        from diffusers import AutoencoderKL
+        module = AutoencoderKL.from_pretrained(repo, subfolder="vae", torch_dtype=_dtype(use_fp16), use_safetensors=False)
+    else:
+        from transformers import CLIPTextModel
+        module = CLIPTextModel.from_pretrained(repo, subfolder="text_encoder", torch_dtype=_dtype(use_fp16),
+                                               use_safetensors=False)
+    return module.to(device).eval()
+
+
+# ---------- component fingerprints ----------
+
+# The files the loaders read (the editors load with use_safetensors=False)
+_WEIGHT_FILES = {"vae": "diffusion_pytorch_model.bin", "text_encoder": "pytorch_model.bin"}
+_TOKENIZER_FILES = ("vocab.json", "merges.txt")
+_FP_CACHE: Dict[Tuple[str, str, bool], Optional[str]] = {}
+
+
+def _fingerprint(repo: str, kind: str, trust_config: bool = False) -> Optional[str]:
+    """Content identity of repo/<kind> (None when it cannot be established)."""
+    ck = (repo, kind, trust_config)
+    if ck not in _FP_CACHE:
+        try:
+            if kind == "tokenizer":
+                ident = [_read(repo, f"tokenizer/{f}") for f in _TOKENIZER_FILES]
+            else:
+                cfg = json.loads(_read(repo, f"{kind}/config.json"))
+                for k in ("_name_or_path", "_diffusers_version", "transformers_version", "torch_dtype"):
+                    cfg.pop(k, None)
+                weights = [] if trust_config else _weight_checksums(repo, kind)
+                if not trust_config and not weights:
+                    raise LookupError("no weight checksums")
+                ident = [json.dumps(cfg, sort_keys=True)] + weights
+            _FP_CACHE[ck] = hashlib.sha1("\n".join(ident).encode()).hexdigest()
+        except Exception:
+            _FP_CACHE[ck] = None
+    return _FP_CACHE[ck]
+
+
+def _read(repo: str, filename: str) -> str:
+    if os.path.isdir(repo):
+        return (Path(repo) / filename).read_text(encoding="utf-8")
+    from huggingface_hub import hf_hub_download
+    return Path(hf_hub_download(repo, filename)).read_text(encoding="utf-8")
+
+
+def _weight_checksums(repo: str, subfolder: str) -> List[str]:
+    """sha256 of the weight file: from the Hub's LFS metadata, or hashed locally for a directory."""
+    filename = f"{subfolder}/{_WEIGHT_FILES[subfolder]}"
+    if os.path.isdir(repo):
+        path = Path(repo) / filename
+        if not path.is_file():
+            return []
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 24), b""):
+                h.update(chunk)
+        return [h.hexdigest()]
+    from huggingface_hub import HfApi
+    info = HfApi().model_info(repo, files_metadata=True)
+    for s in info.siblings:
+        if s.rfilename == filename and s.lfs is not None:
+            return [s.lfs["sha256"] if isinstance(s.lfs, dict) else s.lfs.sha256]
+    return []
+
+
+# ---------- process-wide instance ----------
+
+_REGISTRY: Optional[PipelineRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_pipeline_registry(share: str = "auto") -> PipelineRegistry:
+    """The registry every EditManager of this process uses (created on first call)."""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = PipelineRegistry(share)
+        return _REGISTRY
@@ -0,0 +1,139 @@
+# src/editors/placement.py
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+Box = Tuple[int, int, int, int]
+
+# Where the first instance goes relative to the reference, and which way the next ones line up
+_SIDE = {"left_of": -1, "right_of": 1}
+_DEPTH_SCALE = {"in_front_of": 1.15, "behind": 0.85}  # closer objects look bigger
+_ROWS = 3  # rows of slots tried before giving up on an instance
+
+
+def placement_boxes(rel: Optional[str], ref: Optional[Box], count: int, size: Tuple[int, int],
+                    gap: float = 0.05, scale: float = 1.0) -> List[Box]:
+    """
+    One (x1, y1, x2, y2) region per instance to add, in image pixels.
+
+    Instances take the reference box's size (x *scale*) and stand on its ground line:
+    left_of / right_of line up sideways from it, above / below stack vertically,
+    in_front_of / behind sit lower / higher in the frame and bigger / smaller.
+    next_to picks the side with more room. Without a reference the region is a
+    centred square on the lower part of the frame.
+
+    A slot less than half inside the frame is skipped: sideways instances continue
+    on the other side of the reference, then in rows stacked above (below the first
+    row for below / in_front_of). Fewer than
+    *count* regions come back only when the frame has no room left.
+    """
+    W, H = size
+    count = max(int(count), 1)
+    if ref is None:
+        s = int(min(W, H) / 3)
+        cx, bottom = W // 2, int(H * 0.85)
+        ref, rel = (cx - s // 2, bottom - s, cx + s // 2, bottom), "centre"
+    x1, y1, x2, y2 = map(int, ref)
+    w = max(int((x2 - x1) * scale * _DEPTH_SCALE.get(rel, 1.0)), 8)
+    h = max(int((y2 - y1) * scale * _DEPTH_SCALE.get(rel, 1.0)), 8)
+    g = int(round(gap * max(x2 - x1, 1)))
+
+    if rel == "next_to":
+        rel = "left_of" if x1 > W - x2 else "right_of"
+    if rel in _SIDE:
+        other = "right_of" if rel == "left_of" else "left_of"
+        rows = [y2 - r * (h + g) for r in range(_ROWS)]  # ground line, then stacked above
+        slots = [b for bottom in rows
+                 for side in (rel, other) for b in _row(side, x1, x2, bottom, w, h, g, count)]
+    else:
+        cx = (x1 + x2) // 2
+        if rel == "above":
+            bottom = y1 - g
+        elif rel == "below":
+            bottom = y2 + g + h
+        elif rel == "in_front_of":
+            bottom = y2 + h // 4
+        elif rel == "behind":
+            bottom = y2 - h // 4
+        else:  # centre
+            bottom = y2
+        # overflow rows go away from the reference: down for below / in_front_of, up otherwise
+        down = 1 if rel in ("below", "in_front_of") else -1
+        slots = []
+        for r in range(_ROWS):
+            for i in range(2 * count):  # side by side, alternating right / left of the first one
+                k = (i + 1) // 2 * (1 if i % 2 else -1)
+                left = cx - w // 2 + k * (w + g)
+                b = bottom + down * r * (h + g)
+                slots.append((left, b - h, left + w, b))
+
+    out: List[Box] = []
+    for b in slots:
+        if len(out) == count:
+            break
+        if _clipped_share(b, W, H) >= 0.5:
+            out.append(_clip(b, W, H))
+    return out
+
+
+def _row(rel: str, x1: int, x2: int, bottom: int, w: int, h: int, g: int, count: int) -> List[Box]:
+    step = _SIDE[rel]
+    start = x1 - g - w if step < 0 else x2 + g
+    return [(start + step * i * (w + g), bottom - h, start + step * i * (w + g) + w, bottom) for i in range(count)]
+
+
+def _clip(b: Box, W: int, H: int) -> Optional[Box]:
+    x1, y1, x2, y2 = max(b[0], 0), max(b[1], 0), min(b[2], W), min(b[3], H)
+    return (x1, y1, x2, y2) if x2 > x1 and y2 > y1 else None
+
+
+def _clipped_share(b: Box, W: int, H: int) -> float:
+    c = _clip(b, W, H)
+    if c is None:
+        return 0.0
+    return (c[2] - c[0]) * (c[3] - c[1]) / max((b[2] - b[0]) * (b[3] - b[1]), 1)
+
+
+def placement_mask(boxes: List[Box], size: Tuple[int, int], exclude: Optional[np.ndarray] = None) -> np.ndarray:
+    """[H, W] bool union of the regions, minus *exclude* (the reference object is not repainted)."""
+    W, H = size
+    m = np.zeros((H, W), dtype=bool)
+    for x1, y1, x2, y2 in boxes:
+        m[y1:y2, x1:x2] = True
+    if exclude is not None:
+        m &= ~np.asarray(exclude, dtype=bool)
+    return m
+
+
+def plan_placement(plan, grounding_info: Dict[str, Any], size: Tuple[int, int],
+                   gap: float = 0.05, scale: float = 1.0) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Inpainting mask for the plan's add operation: regions from plan.relations, the
+    reference's grounded box and Target.count. Returns (mask, placement record).
+    """
+    op = next(o for o in plan.ops if o.type == "add")
+    added = next((t for t in plan.targets if t.name == op.target), None)
+    count = added.count if added is not None else 1
+
+    grounded = {t["name"]: t for t in grounding_info.get("targets", []) if len(t.get("boxes", [])) > 0}
+    rel, ref_name = None, None
+    for r in plan.relations:
+        if r.subj == op.target and r.obj in grounded:
+            rel, ref_name = r.rel, r.obj
+            break
+    if ref_name is None:  # no usable relation: any grounded object other than the added one
+        ref_name = next((n for n in grounded if n != op.target), None)
+        rel = "next_to" if ref_name is not None else None
+
+    ref_box, ref_mask = None, None
+    if ref_name is not None:
+        ref = grounded[ref_name]
+        ref_box = tuple(ref["boxes"][0])
+        if ref.get("masks") is not None and len(ref["masks"]) > 0:
+            ref_mask = ref["masks"][0]
+
+    boxes = placement_boxes(rel, ref_box, count, size, gap, scale)
+    record = {"target": op.target, "count": count, "relation": rel, "reference": ref_name,
+              "reference_box": list(ref_box) if ref_box else None, "boxes": [list(b) for b in boxes],
+              "shortfall": count - len(boxes)}
+    return placement_mask(boxes, size, ref_mask), record
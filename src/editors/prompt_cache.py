@@ -0,0 +1,124 @@
+# src/editors/prompt_cache.py
+from __future__ import annotations
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+
+class PromptEmbeddingCache:
+    """
+    In-memory LRU of CLIP prompt embeddings, bounded by *max_bytes*.
+
+    Keyed by (text encoder, tokenizer, device, dtype, prompt): the editor pipelines
+    share their text encoder through the pipeline registry, so one entry serves
+    InstructPix2Pix and Add-It alike, and the empty negative prompt is encoded once
+    per process. Encoders are keyed by object id, and every entry holds weak references
+    to the encoder and tokenizer it was computed with: an entry whose objects are gone
+    (an id reused after a reload) is a miss, never a stale hit.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20):
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._items: "OrderedDict[tuple, Tuple[tuple, torch.Tensor]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(pipe, prompt: str) -> Tuple:
+        te = pipe.text_encoder
+        return (id(te), id(pipe.tokenizer), str(te.device), str(te.dtype), prompt)
+
+    def get(self, pipe, prompt: str) -> torch.Tensor:
+        """[1, 77, dim] embedding of *prompt* with *pipe*'s tokenizer / text encoder."""
+        k = self.key(pipe, prompt)
+        with self._lock:
+            entry = self._items.get(k)
+            if entry is not None:
+                (te, tok), emb = entry
+                if te() is pipe.text_encoder and tok() is pipe.tokenizer:
+                    self._items.move_to_end(k)
+                    self.hits += 1
+                    return emb
+                self._drop(k)  # id reused by a new encoder
+            self.misses += 1
+        emb = _encode(pipe, prompt)
+        with self._lock:
+            if k not in self._items:
+                self._items[k] = ((weakref.ref(pipe.text_encoder), weakref.ref(pipe.tokenizer)), emb)
+                self._bytes += _nbytes(emb)
+                self._evict()
+        return emb
+
+    def embeds(self, pipe, prompts: List[str], negative: str = "") -> Dict[str, torch.Tensor]:
+        """prompt_embeds / negative_prompt_embeds for a diffusers call on *prompts*."""
+        pos = torch.cat([self.get(pipe, p) for p in prompts])
+        neg = self.get(pipe, negative).expand(len(prompts), -1, -1)
+        return {"prompt_embeds": pos, "negative_prompt_embeds": neg}
+
+    def _drop(self, k: tuple) -> None:
+        _, emb = self._items.pop(k)
+        self._bytes -= _nbytes(emb)
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and len(self._items) > 1:
+            self._drop(next(iter(self._items)))
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                    "items": len(self._items), "mb": round(self._bytes / 2**20, 2)}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+def _nbytes(t: torch.Tensor) -> int:
+    return t.numel() * t.element_size()
+
+
+def _encode(pipe, prompt: str) -> torch.Tensor:
+    # Same tokenization / encoding as the SD pipelines' encode_prompt (no clip skip)
+    tok, te = pipe.tokenizer, pipe.text_encoder
+    ids = tok(prompt, padding="max_length", max_length=tok.model_max_length,
+              truncation=True, return_tensors="pt")
+    attn = None
+    if getattr(te.config, "use_attention_mask", False):
+        attn = ids.attention_mask.to(te.device)
+    with torch.no_grad():
+        return te(ids.input_ids.to(te.device), attention_mask=attn)[0]
+
+
+_CACHE: Optional[PromptEmbeddingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_prompt_cache(max_mb: int = 64) -> PromptEmbeddingCache:
+    """The cache every editor of this process uses (created on first call; a new *max_mb* resizes it)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = PromptEmbeddingCache(int(max_mb) << 20)
+        elif _CACHE.max_bytes != int(max_mb) << 20:
+            _CACHE.resize(int(max_mb) << 20)
+        return _CACHE
+
+
+def clear_prompt_cache() -> None:
+    """Drops every embedding (called when the pipeline registry is cleared)."""
+    with _CACHE_LOCK:
+        if _CACHE is not None:
+            _CACHE.clear()
@@ -1,10 +1,16 @@
 # src/editors/real_editors.py
 from __future__ import annotations
-from typing import Optional
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
 import numpy as np
 from PIL import Image
 import torch
 
+from src.utils.image_context import ImageContext
+
 from diffusers import (
     StableDiffusionInstructPix2PixPipeline,
     ControlNetModel,
@@ -24,7 +30,8 @@ def _dtype(use_fp16: bool):
     return torch.float16 if use_fp16 and torch.cuda.is_available() else torch.float32
 
 
-def load_instructpix2pix(model_name: str, device="cuda", use_fp16=True):
+def load_instructpix2pix(model_name: str, device="cuda", use_fp16=True, **components):
+    # components: already loaded vae / text_encoder / tokenizer to reuse (see pipeline_registry)
     try:
         pipe = StableDiffusionInstructPix2PixPipeline.from_pretrained(
             model_name,
@@ -32,6 +39,7 @@ def load_instructpix2pix(model_name: str, device="cuda", use_fp16=True):
             safety_checker=None,
             use_safetensors=False,
             low_cpu_mem_usage=True,
+            **components,
         ).to(device)
         pipe.enable_attention_slicing()
         return pipe
@@ -39,7 +47,7 @@ def load_instructpix2pix(model_name: str, device="cuda", use_fp16=True):
         raise RuntimeError(f"InstructPix2Pix load failed: {e}")
 
 
-def load_addit(base_model: str, controlnet_model: str, device="cuda", use_fp16=True):
+def load_addit(base_model: str, controlnet_model: str, device="cuda", use_fp16=True, **components):
     try:
         cn = ControlNetModel.from_pretrained(
             controlnet_model,
@@ -53,6 +61,7 @@ def load_addit(base_model: str, controlnet_model: str, device="cuda", use_fp16=T
             safety_checker=None,
             use_safetensors=False,
             low_cpu_mem_usage=True,
+            **components,
         ).to(device)
         pipe.enable_attention_slicing()
         return pipe
@@ -61,6 +70,8 @@ def load_addit(base_model: str, controlnet_model: str, device="cuda", use_fp16=T
 
 
 def _ensure_pil_rgb(x) -> Image.Image:
+    if isinstance(x, ImageContext):
+        return x.rgb
     if isinstance(x, Image.Image):
         return x.convert("RGB")
     if isinstance(x, np.ndarray):
@@ -70,9 +81,10 @@ def _ensure_pil_rgb(x) -> Image.Image:
     raise TypeError(f"Expected PIL.Image or np.ndarray, got {type(x)}")
 
 
-def _resize_multiple_of_8(img: Image.Image, max_side: int = 768) -> Image.Image:
+def _resize_multiple_of_8(img: Image.Image, max_side: int = 768, min_side: int = 0) -> Image.Image:
     w, h = img.size
-    scale = min(max_side / max(w, h), 1.0)
+    # min_side: small inputs (ROI crops) are upscaled towards the model's native resolution
+    scale = min(max_side / max(w, h), max(min_side / min(w, h), 1.0))
     nw, nh = int((w * scale) // 8 * 8), int((h * scale) // 8 * 8)
     nw = max(nw, 8)
     nh = max(nh, 8)
@@ -81,29 +93,134 @@ def _resize_multiple_of_8(img: Image.Image, max_side: int = 768) -> Image.Image:
     return img
 
 
+def _editor_input(image, max_side: int = 768, min_side: int = 0) -> Image.Image:
+    """RGB input at a multiple of 8; memoised when *image* is an ImageContext."""
+    if isinstance(image, ImageContext):
+        return image.derive(("editor_input", max_side, min_side),
+                            lambda c: _resize_multiple_of_8(c.rgb, max_side, min_side))
+    return _resize_multiple_of_8(_ensure_pil_rgb(image), max_side, min_side)
+
+
+# ---------- depth control image ----------
+
+DEPTH_CACHE_ITEMS = 32
+MIDAS_RETRY_S = 60.0  # a failed load (e.g. Hub / network error) is retried after this long
+
+_MIDAS = None
+_MIDAS_ERROR: Optional[str] = None
+_MIDAS_FAILED_AT: Optional[float] = None
+_DEPTH_LOCK = threading.Lock()
+_DEPTH_CACHE: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+_DEPTH_STATS = {"hits": 0, "misses": 0}
+_GREY: Dict[tuple, Image.Image] = {}
+
+
+def _get_midas():
+    """Depth annotator, loaded once per process (a failed load is retried after MIDAS_RETRY_S)."""
+    global _MIDAS, _MIDAS_ERROR, _MIDAS_FAILED_AT
+    if _MIDAS is None and _HAS_MIDAS and (
+            _MIDAS_FAILED_AT is None or time.monotonic() - _MIDAS_FAILED_AT >= MIDAS_RETRY_S):
+        try:
+            _MIDAS = MidasDetector.from_pretrained("lllyasviel/Annotators")
+            _MIDAS_ERROR = None
+        except Exception as e:
+            _MIDAS_ERROR, _MIDAS_FAILED_AT = str(e), time.monotonic()
+            print(f"[WARN] MiDaS load failed, grey control image until retry in {MIDAS_RETRY_S:.0f}s: {e}")
+    return _MIDAS
+
+
+def _grey(size) -> Image.Image:
+    # Neutral fallback, one shared image per size (the pipeline only reads it)
+    if size not in _GREY:
+        _GREY[size] = Image.new("L", size, 128)
+    return _GREY[size]
+
+
 def _build_control_image(img_rgb: Image.Image, device: str) -> Image.Image:
     """
     Génère une carte de profondeur (control image) si controlnet_aux est dispo.
     Sinon, retourne un gris uniforme comme fallback.
+
+    The map is returned at img_rgb's size and cached by (image hash, size), so
+    repeated edits of the same source image skip MiDaS.
     """
-    if _HAS_MIDAS:
+    key = (hashlib.blake2b(img_rgb.tobytes(), digest_size=16).hexdigest(), img_rgb.mode, img_rgb.size)
+    with _DEPTH_LOCK:
+        depth = _DEPTH_CACHE.get(key)
+        if depth is not None:
+            _DEPTH_CACHE.move_to_end(key)
+            _DEPTH_STATS["hits"] += 1
+            return depth
+        _DEPTH_STATS["misses"] += 1
+
+        midas = _get_midas()
+        if midas is None:
+            return _grey(img_rgb.size)
         try:
-            midas = MidasDetector.from_pretrained("lllyasviel/Annotators")
             depth = midas(img_rgb)  # PIL Image (mono)
-            return depth
         except Exception:
-            pass
-    # Fallback neutre
-    return Image.new("L", img_rgb.size, 128)
+            return _grey(img_rgb.size)
+        # S'assurer que la control_image a exactement la même taille que l'image
+        if depth.size != img_rgb.size:
+            depth = depth.resize(img_rgb.size, Image.LANCZOS)
+        _DEPTH_CACHE[key] = depth
+        while len(_DEPTH_CACHE) > DEPTH_CACHE_ITEMS:
+            _DEPTH_CACHE.popitem(last=False)
+        return depth
+
+
+def depth_cache_stats() -> Dict[str, Any]:
+    with _DEPTH_LOCK:
+        return {**_DEPTH_STATS, "items": len(_DEPTH_CACHE), "midas_loaded": _MIDAS is not None,
+                "midas_error": _MIDAS_ERROR}
+
+
+def _mask_pil(mask: Optional[np.ndarray], size) -> Image.Image:
+    """Inpainting mask as L at *size* (255 = zone à inpeindre)."""
+    if mask is None:
+        # Par défaut: autoriser l'inpainting partout (plein blanc)
+        return Image.new("L", size, 255)
+    # Handle boolean masks
+    if mask.dtype == bool:
+        m = mask.astype(np.uint8) * 255
+    elif mask.dtype == np.uint8:
+        # Already uint8, use as-is (should be 0 or 255)
+        m = mask
+    else:
+        # Other numeric types: threshold at 0.5 if normalized
+        if mask.max() <= 1.0:
+            m = (mask > 0.5).astype(np.uint8) * 255
+        else:
+            m = (mask > 127).astype(np.uint8) * 255
+
+    mask_pil = Image.fromarray(m) if isinstance(m, np.ndarray) else m
+    if mask_pil.mode != "L":
+        mask_pil = mask_pil.convert("L")
+    return mask_pil.resize(size, Image.NEAREST)
+
+
+def encode_source(pipe, img_rgb: Image.Image) -> torch.Tensor:
+    """[1, 4, h/8, w/8] VAE latent of *img_rgb*, encoded the way InstructPix2Pix encodes its image (unscaled mode)."""
+    x = pipe.image_processor.preprocess(img_rgb).to(device=pipe.device, dtype=pipe.vae.dtype)
+    with torch.no_grad():
+        return pipe.vae.encode(x).latent_dist.mode()
+
+
+def _prompt_kwargs(pipe, prompts: List[str], prompt_cache) -> Dict[str, Any]:
+    # Cached CLIP embeddings when a PromptEmbeddingCache is given, raw strings otherwise
+    if prompt_cache is None:
+        return {"prompt": prompts[0] if len(prompts) == 1 else list(prompts)}
+    return prompt_cache.embeds(pipe, prompts)
 
 
 def run_instructpix2pix(pipe, image: Image.Image, prompt: str,
-                        strength=0.8, guidance_scale=7.5, num_inference_steps=30):
-    img_rgb = _ensure_pil_rgb(image)
-    img_rgb = _resize_multiple_of_8(img_rgb)
+                        strength=0.8, guidance_scale=7.5, num_inference_steps=30, prompt_cache=None,
+                        latent_cache=None):
+    img_rgb = _editor_input(image)
     out = pipe(
-        prompt=prompt,
-        image=img_rgb,
+        **_prompt_kwargs(pipe, [prompt], prompt_cache),
+        # the pipeline takes a 4-channel tensor as the already encoded image
+        image=img_rgb if latent_cache is None else latent_cache.get(pipe, img_rgb),
         strength=strength,
         guidance_scale=guidance_scale,
         num_inference_steps=num_inference_steps,
@@ -114,45 +231,19 @@ def run_instructpix2pix(pipe, image: Image.Image, prompt: str,
 
 
 def run_addit(pipe, image: Image.Image, mask: Optional[np.ndarray], prompt: str,
-              num_inference_steps=40, guidance_scale=7.5):
+              num_inference_steps=40, guidance_scale=7.5, prompt_cache=None):
     # --- Sécurité et normalisation ---
     if image is None:
         raise ValueError("run_addit: image is None (check image loading path).")
 
-    img_rgb = _ensure_pil_rgb(image)
-    img_rgb = _resize_multiple_of_8(img_rgb)
-
-    # Masque (L, 255 = zone à inpeindre)
-    if mask is not None:
-        # Handle boolean masks
-        if mask.dtype == bool:
-            m = mask.astype(np.uint8) * 255
-        elif mask.dtype == np.uint8:
-            # Already uint8, use as-is (should be 0 or 255)
-            m = mask
-        else:
-            # Other numeric types: threshold at 0.5 if normalized
-            if mask.max() <= 1.0:
-                m = (mask > 0.5).astype(np.uint8) * 255
-            else:
-                m = (mask > 127).astype(np.uint8) * 255
-        
-        mask_pil = Image.fromarray(m) if isinstance(m, np.ndarray) else m
-        if mask_pil.mode != "L":
-            mask_pil = mask_pil.convert("L")
-        mask_pil = mask_pil.resize(img_rgb.size, Image.NEAREST)
-    else:
-        # Par défaut: autoriser l'inpainting partout (plein blanc)
-        mask_pil = Image.new("L", img_rgb.size, 255)
+    img_rgb = _editor_input(image)
+    mask_pil = _mask_pil(mask, img_rgb.size)
 
-    # Control image (profondeur) pour ControlNet
+    # Control image (profondeur) pour ControlNet, already at the image size
     control_img = _build_control_image(img_rgb, device=str(pipe.device))
-    # S'assurer que la control_image a exactement la même taille que l'image
-    if control_img.size != img_rgb.size:
-        control_img = control_img.resize(img_rgb.size, Image.LANCZOS)
 
     out = pipe(
-        prompt=prompt,
+        **_prompt_kwargs(pipe, [prompt], prompt_cache),
         image=img_rgb,
         mask_image=mask_pil,
         control_image=control_img,
@@ -161,4 +252,51 @@ def run_addit(pipe, image: Image.Image, mask: Optional[np.ndarray], prompt: str,
     )
     if not hasattr(out, "images") or not out.images:
         raise RuntimeError("Add-It returned no image.")
-    return out.images[0]
\ No newline at end of file
+    return out.images[0]
+
+
+# ---------- batched editing (several instructions, one source image) ----------
+
+def run_instructpix2pix_batch(pipe, image, prompts: List[str],
+                              strength=0.8, guidance_scale=7.5, num_inference_steps=30,
+                              prompt_cache=None, latent_cache=None) -> List[Image.Image]:
+    """
+    One denoising loop for all *prompts* on the same image. The source is VAE-encoded
+    once here (or taken from *latent_cache*) and handed to the pipeline as latents.
+    """
+    img_rgb = _editor_input(image)
+    latents = encode_source(pipe, img_rgb) if latent_cache is None else latent_cache.get(pipe, img_rgb)
+    out = pipe(
+        **_prompt_kwargs(pipe, prompts, prompt_cache),
+        image=latents.expand(len(prompts), -1, -1, -1),
+        strength=strength,
+        guidance_scale=guidance_scale,
+        num_inference_steps=num_inference_steps,
+    )
+    if not hasattr(out, "images") or len(out.images) != len(prompts):
+        raise RuntimeError("InstructPix2Pix returned no image.")
+    return list(out.images)
+
+
+def run_addit_batch(pipe, image, masks: List[Optional[np.ndarray]], prompts: List[str],
+                    num_inference_steps=40, guidance_scale=7.5, prompt_cache=None) -> List[Image.Image]:
+    """
+    One denoising loop for all (mask, prompt) pairs on the same image: the image and
+    its depth control image are given once and broadcast by the pipeline over the
+    per-sample masks (only the masked images differ, so only those are encoded per sample).
+    """
+    if image is None:
+        raise ValueError("run_addit: image is None (check image loading path).")
+    img_rgb = _editor_input(image)
+    control_img = _build_control_image(img_rgb, device=str(pipe.device))
+    out = pipe(
+        **_prompt_kwargs(pipe, prompts, prompt_cache),
+        image=img_rgb,
+        mask_image=[_mask_pil(m, img_rgb.size) for m in masks],
+        control_image=control_img,
+        guidance_scale=guidance_scale,
+        num_inference_steps=num_inference_steps,
+    )
+    if not hasattr(out, "images") or len(out.images) != len(prompts):
+        raise RuntimeError("Add-It returned no image.")
+    return list(out.images)
@@ -0,0 +1,61 @@
+# src/editors/roi.py
+from __future__ import annotations
+from typing import Optional, Tuple
+import numpy as np
+from PIL import Image, ImageFilter
+
+Box = Tuple[int, int, int, int]
+
+
+def roi_window(mask: np.ndarray, pad: float = 0.25, min_side: int = 256, multiple: int = 8) -> Optional[Box]:
+    """
+    (x0, y0, x1, y1) window around the mask's bbox, padded by *pad* x its longer side
+    on every edge, grown to at least *min_side* (the model needs context) and to a
+    multiple of *multiple*, then clipped to the image. None for an empty mask.
+    """
+    H, W = mask.shape[:2]
+    rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0:
+        return None
+    y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    p = int(round(pad * max(x1 - x0, y1 - y0)))
+    xa, xb = _span(int(x0) - p, int(x1) + p, W, min_side, multiple)
+    ya, yb = _span(int(y0) - p, int(y1) + p, H, min_side, multiple)
+    return (xa, ya, xb, yb)
+
+
+def _span(a: int, b: int, n: int, min_len: int, multiple: int) -> Tuple[int, int]:
+    """[a, b) grown symmetrically to min_len / a multiple of *multiple*, shifted inside [0, n)."""
+    length = min(max(b - a, min_len), n)
+    if length < n:
+        length = min(-(-length // multiple) * multiple, n)
+    c = (a + b) / 2.0
+    start = int(round(c - length / 2.0))
+    start = min(max(start, 0), n - length)
+    return start, start + length
+
+
+def feather(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Soft alpha [h, w] in [0, 1]: the mask dilated by *radius*, then blurred by it.
+    Exactly 1 deep inside the mask, exactly 0 beyond ~2x radius."""
+    m = Image.fromarray(np.asarray(mask, dtype=np.uint8) * 255)
+    if radius > 0:
+        m = m.filter(ImageFilter.MaxFilter(2 * radius + 1)).filter(ImageFilter.GaussianBlur(radius))
+    return np.asarray(m, dtype=np.float32) / 255.0
+
+
+def paste_back(original: np.ndarray, edited: Image.Image, window: Box, alpha: np.ndarray) -> Image.Image:
+    """
+    Blends the edited crop into *original* ([H, W, 3] uint8) at *window* through *alpha*.
+    Pixels where alpha is 0 (everything outside the feathered mask) are copied bit-exact.
+    """
+    x0, y0, x1, y1 = window
+    edited = edited.convert("RGB")
+    if edited.size != (x1 - x0, y1 - y0):
+        edited = edited.resize((x1 - x0, y1 - y0), Image.LANCZOS)
+    out = np.array(original, dtype=np.uint8, copy=True)
+    region = out[y0:y1, x0:x1]
+    a = alpha[..., None]
+    mixed = np.rint(region * (1.0 - a) + np.asarray(edited, dtype=np.float32) * a).astype(np.uint8)
+    np.copyto(region, mixed, where=alpha[..., None] > 0)
+    return Image.fromarray(out)
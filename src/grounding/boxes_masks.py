@@ -1,9 +1,15 @@
 # src/grounding/boxes_masks.py
 from __future__ import annotations
+import threading
 import numpy as np
 import torch
 from typing import List, Tuple, Dict, Any
 
+from .masks import MaskList, RLEMask
+
+# SamPredictor keeps per-image state: serialize set_image/predict across threads
+SAM_LOCK = threading.RLock()
+
 def to_xyxy(boxes: np.ndarray) -> np.ndarray:
     # boxes already xyxy in GroundingDINO
     return boxes
@@ -17,51 +23,261 @@ def _to_np(x):
     return np.array(x)
 
 
-def nms_xyxy(boxes: np.ndarray, scores: np.ndarray, iou_thresh: float) -> List[int]:
-    import numpy as np
-    import torch
-
-    boxes = boxes if isinstance(boxes, np.ndarray) else _to_np(boxes)
-    scores = scores if isinstance(scores, np.ndarray) else _to_np(scores)
-
-    try:
-        import torchvision
-        t_boxes = torch.as_tensor(boxes, dtype=torch.float32)
-        t_scores = torch.as_tensor(scores, dtype=torch.float32)
-        keep = torchvision.ops.nms(t_boxes, t_scores, iou_thresh)
-        return keep.cpu().numpy().tolist()
-    except Exception:
-        # Greedy NMS
-        order = scores.argsort()[::-1]
-        keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-            if order.size == 1:
-                break
-            ious = _iou(boxes[i], boxes[order[1:]])
-            inds = np.where(ious <= iou_thresh)[0]
-            order = order[inds + 1]
-        return keep
-
-def _iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
-    xA = np.maximum(a[0], b[:,0]); yA = np.maximum(a[1], b[:,1])
-    xB = np.minimum(a[2], b[:,2]); yB = np.minimum(a[3], b[:,3])
-    inter = np.maximum(0, xB - xA) * np.maximum(0, yB - yA)
-    areaA = (a[2]-a[0])*(a[3]-a[1])
-    areaB = (b[:,2]-b[:,0])*(b[:,3]-b[:,1])
-    return inter / (areaA + areaB - inter + 1e-6)
-
-def sam_masks_from_boxes(predictor, image_np_bgr: np.ndarray, boxes_xyxy: np.ndarray) -> np.ndarray:
+def set_image_cached(predictor, image_np: np.ndarray, embed_cache=None, variant: str = "") -> bool:
+    """
+    predictor.set_image, served from *embed_cache* (SamEmbeddingCache) when possible.
+    On a hit the stored features are loaded into the predictor and the SAM
+    image encoder is skipped. Returns True on a hit.
+    """
+    if embed_cache is None:
+        predictor.set_image(image_np)
+        return False
+
+    H, W = image_np.shape[:2]
+    target = predictor.transform.target_length
+    key = embed_cache.key(image_np, variant, target)
+    feats = embed_cache.get(key)
+    if feats is not None:
+        predictor.reset_image()
+        param = next(predictor.model.parameters())
+        predictor.features = torch.from_numpy(np.array(feats)).to(device=predictor.device, dtype=param.dtype)
+        predictor.original_size = (H, W)
+        predictor.input_size = tuple(predictor.transform.get_preprocess_shape(H, W, target))
+        predictor.is_image_set = True
+        return True
+
+    predictor.set_image(image_np)
+    embed_cache.put(key, predictor.features.detach().float().cpu().numpy())
+    return False
+
+
+def sam_masks_from_boxes(predictor, image_np_bgr: np.ndarray, boxes_xyxy: np.ndarray,
+                         embed_cache=None, variant: str = "") -> np.ndarray:
     """
     Returns boolean masks [N, H, W] given image and list of boxes.
     """
-    predictor.set_image(image_np_bgr)  # SAM expects original image (BGR/RGB depends on preprocess upstream)
-    masks_all = []
-    for b in boxes_xyxy:
-        box = np.array(b, dtype=np.float32)
-        masks, _, _ = predictor.predict(point_coords=None, point_labels=None, box=box[None, :], multimask_output=False)
-        masks_all.append(masks[0].astype(bool))
-    if not masks_all:
-        return np.zeros((0, image_np_bgr.shape[0], image_np_bgr.shape[1]), dtype=bool)
-    return np.stack(masks_all, axis=0)
+    return sam_masks_for_targets(predictor, image_np_bgr, [boxes_xyxy], embed_cache, variant)[0]
+
+
+def sam_masks_for_targets(predictor, image_np: np.ndarray, boxes_per_target: List[np.ndarray],
+                          embed_cache=None, variant: str = "") -> List[np.ndarray]:
+    """
+    Boolean masks for several targets in one SAM pass.
+
+    The image is embedded once (or loaded from *embed_cache*), then every box of
+    every target goes through the prompt encoder / mask decoder as a single batch.
+    The result is split back per target: one [N_i, H, W] array for each entry of
+    *boxes_per_target*.
+    """
+    H, W = image_np.shape[:2]
+    boxes_per_target = [np.asarray(b, dtype=np.float32).reshape(-1, 4) for b in boxes_per_target]
+    counts = [len(b) for b in boxes_per_target]
+    if sum(counts) == 0:
+        return [np.zeros((0, H, W), dtype=bool) for _ in counts]
+
+    masks, _ = _sam_batch(predictor, image_np, np.concatenate(boxes_per_target, axis=0), embed_cache, variant)
+    return _split(masks, counts)
+
+
+def _sam_batch(predictor, image_np: np.ndarray, boxes: np.ndarray, embed_cache=None, variant: str = ""):
+    """Masks [N, H, W] bool and SAM's predicted IoU [N] for N boxes, one decoder batch."""
+    H, W = image_np.shape[:2]
+    with SAM_LOCK:
+        # SAM expects original image (BGR/RGB depends on preprocess upstream)
+        set_image_cached(predictor, image_np, embed_cache, variant)
+        t_boxes = torch.as_tensor(boxes, dtype=torch.float32, device=predictor.device)
+        t_boxes = predictor.transform.apply_boxes_torch(t_boxes, (H, W))
+        with torch.inference_mode():
+            masks, iou, _ = predictor.predict_torch(
+                point_coords=None, point_labels=None, boxes=t_boxes, multimask_output=False
+            )
+    return masks[:, 0].cpu().numpy().astype(bool), iou[:, 0].float().cpu().numpy()
+
+
+def _split(arr: np.ndarray, counts: List[int]) -> List[np.ndarray]:
+    out, start = [], 0
+    for n in counts:
+        out.append(arr[start:start + n])
+        start += n
+    return out
+
+
+def sam_masks_with_policy(backend, image_np: np.ndarray, boxes_per_target: List[np.ndarray],
+                          embed_cache=None) -> Tuple[List[np.ndarray], Dict[str, Any]]:
+    """
+    sam_masks_for_targets over a SamBackend: every box goes through the variant the
+    policy starts with; boxes whose predicted IoU stays below policy.min_iou are re-run
+    on the next variants of the ladder, keeping the better-scored mask.
+    Returns (masks per target, decision record for the grounding meta).
+    """
+    H, W = image_np.shape[:2]
+    boxes_per_target = [np.asarray(b, dtype=np.float32).reshape(-1, 4) for b in boxes_per_target]
+    counts = [len(b) for b in boxes_per_target]
+    all_boxes = np.concatenate(boxes_per_target, axis=0) if counts else np.zeros((0, 4), np.float32)
+    order = backend.choose(all_boxes, (H, W))
+    record: Dict[str, Any] = {"order": order, "start": None, "escalations": []}
+
+    masks = iou = None
+    for variant in order:
+        todo = np.arange(len(all_boxes)) if iou is None else np.flatnonzero(iou < backend.cfg.policy.min_iou)
+        if len(todo) == 0:
+            break
+        predictor = backend.predictor(variant)
+        if predictor is None:
+            continue  # not loadable: try the next size up
+        m, s = _sam_batch(predictor, image_np, all_boxes[todo], embed_cache, variant)
+        if iou is None:
+            masks, iou, record["start"] = m, s, variant
+            continue
+        better = s > iou[todo]
+        masks[todo[better]], iou[todo[better]] = m[better], s[better]
+        record["escalations"].append({"variant": variant, "boxes": int(len(todo)), "improved": int(better.sum())})
+
+    record["models"] = backend.info
+    if masks is None:
+        return [np.zeros((0, H, W), dtype=bool) for _ in counts], record
+    record["iou"] = [round(float(x), 4) for x in iou]
+    return _split(masks, counts), record
+
+
+# ---------- demand-driven masks ----------
+
+class SamSession:
+    """
+    Everything needed to decode SAM masks for one image (or one crop of it) later,
+    independently of the shared predictor's state: the image embedding is computed
+    (or loaded from *embed_cache*) on first use and kept with its sizes.
+    """
+
+    def __init__(self, predictor, image_np: np.ndarray, embed_cache=None, variant: str = "",
+                 offset: Tuple[int, int] = (0, 0), full_size: Tuple[int, int] | None = None):
+        self.predictor = predictor
+        self._image = image_np
+        self.embed_cache, self.variant = embed_cache, variant
+        self.offset = offset                                  # (x0, y0) of the crop
+        self.full_size = full_size or image_np.shape[:2]      # (H, W) of the whole image
+        self.features = None
+        self.original_size = self.input_size = None
+        self._lock = threading.Lock()
+
+    def _ensure_features(self) -> None:
+        with self._lock:
+            if self.features is not None:
+                return
+            with SAM_LOCK:
+                set_image_cached(self.predictor, self._image, self.embed_cache, self.variant)
+                self.features = self.predictor.features
+                self.original_size = self.predictor.original_size
+                self.input_size = self.predictor.input_size
+            self._image = None  # pixels no longer needed once embedded
+
+    def decode_low_res(self, boxes: np.ndarray):
+        """Low-resolution mask logits [B, 256, 256] and predicted IoU [B] for crop-space boxes."""
+        self._ensure_features()
+        model = self.predictor.model
+        t_boxes = torch.as_tensor(np.asarray(boxes, dtype=np.float32).reshape(-1, 4), device=self.predictor.device)
+        t_boxes = self.predictor.transform.apply_boxes_torch(t_boxes, self.original_size)
+        with torch.inference_mode():
+            sparse, dense = model.prompt_encoder(points=None, boxes=t_boxes, masks=None)
+            low_res, iou = model.mask_decoder(
+                image_embeddings=self.features,
+                image_pe=model.prompt_encoder.get_dense_pe(),
+                sparse_prompt_embeddings=sparse,
+                dense_prompt_embeddings=dense,
+                multimask_output=False,
+            )
+        return low_res[:, 0], iou[:, 0]
+
+    def upsample(self, low_res) -> RLEMask:
+        """One low-res logit map -> full-image RLE mask."""
+        model = self.predictor.model
+        with torch.inference_mode():
+            m = model.postprocess_masks(low_res[None, None], self.input_size, self.original_size)
+        m = (m[0, 0] > model.mask_threshold).cpu().numpy()
+        return RLEMask.from_crop(m, self.offset, self.full_size)
+
+
+class LazySamMasks(MaskList):
+    """
+    MaskList whose masks are produced by SAM only when read.
+
+    Each entry is a (session, crop-space box). Reading mask i runs the prompt encoder
+    and mask decoder for it (the image embedding itself is computed once per session,
+    on the first read), keeps the low-resolution logits and upsamples to full
+    resolution only then. Reading everything (iteration, rles, to_json) decodes the
+    remaining boxes of each session in one batch.
+    """
+
+    def __init__(self, entries: List[Tuple[SamSession, np.ndarray]]):
+        self.entries = list(entries)
+        self._low_res: Dict[int, Any] = {}
+        self._iou: Dict[int, float] = {}
+        self._rles: Dict[int, RLEMask] = {}
+
+    def _decode(self, idx: List[int]) -> None:
+        idx = [i for i in idx if i not in self._low_res]
+        by_session: Dict[int, List[int]] = {}
+        for i in idx:
+            by_session.setdefault(id(self.entries[i][0]), []).append(i)
+        for group in by_session.values():
+            session = self.entries[group[0]][0]
+            low_res, iou = session.decode_low_res(np.stack([self.entries[i][1] for i in group]))
+            for k, i in enumerate(group):
+                self._low_res[i] = low_res[k]
+                self._iou[i] = float(iou[k])
+
+    def _index(self, i: int) -> int:
+        n = len(self.entries)
+        if not -n <= i < n:
+            raise IndexError(f"mask index {i} out of range for {n} masks")
+        return i + n if i < 0 else i
+
+    def low_res_logits(self, i: int):
+        i = self._index(i)
+        self._decode([i])
+        return self._low_res[i]
+
+    def predicted_iou(self, i: int) -> float:
+        i = self._index(i)
+        self._decode([i])
+        return self._iou[i]
+
+    def rle(self, i: int) -> RLEMask:
+        i = self._index(i)
+        if i not in self._rles:
+            self._rles[i] = self.entries[i][0].upsample(self.low_res_logits(i))
+        return self._rles[i]
+
+    @property
+    def rles(self) -> List[RLEMask]:
+        self._decode(list(range(len(self.entries))))
+        return [self.rle(i) for i in range(len(self.entries))]
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        H, W = self.entries[0][0].full_size if self.entries else (0, 0)
+        return (len(self.entries), H, W)
+
+    def materialized(self) -> int:
+        return len(self._rles)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return LazySamMasks(self.entries[i])
+        return self.rle(i).decode()
+
+    def __iter__(self):
+        self._decode(list(range(len(self.entries))))
+        for i in range(len(self.entries)):
+            yield self.rle(i).decode()
+
+    def to_json(self) -> Dict[str, Any]:
+        # Only what was read already: serialising must not run the decoder for the rest
+        return {"format": "rle", "lazy": True,
+                "masks": [self._rles[i].to_json() if i in self._rles else None for i in range(len(self.entries))]}
+
+    def __repr__(self) -> str:
+        return f"LazySamMasks(n={len(self.entries)}, decoded={len(self._rles)})"
@@ -0,0 +1,147 @@
+from __future__ import annotations
+import threading
+from typing import List, Tuple, Dict, Any
+import numpy as np
+import torch
+
+
+# ---------- combined caption ----------
+
+def build_caption(prompts: List[str]) -> Tuple[str, List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Joins target prompts into one GroundingDINO caption ("red car . blue truck .").
+
+    Returns (caption, prompt_spans, noun_spans): character spans of each prompt and of
+    its bare noun (last word). The noun of a multi-word prompt is appended as a phrase
+    of its own ("red car . blue truck . car . truck ."), so the no-attribute fallback
+    is scored on tokens DINO read without the attribute. Identical phrases share one span.
+    """
+    caption, seen = "", {}
+
+    def phrase(p: str) -> Tuple[int, int]:
+        nonlocal caption
+        if p not in seen:
+            seen[p] = len(caption)
+            caption += p + " . "
+        return (seen[p], seen[p] + len(p))
+
+    norm = [p.lower().strip() for p in prompts]
+    prompt_spans = [phrase(p) for p in norm]
+    noun_spans = [phrase(p.rsplit(" ", 1)[-1]) for p in norm]
+    return caption.strip(), prompt_spans, noun_spans
+
+
+def _span_tokens(tokenized, span: Tuple[int, int]) -> List[int]:
+    toks = {tokenized.char_to_token(c) for c in range(*span)}
+    toks.discard(None)
+    return sorted(toks)
+
+
+# ---------- single forward, many targets ----------
+
+def predict_multi(
+    model,
+    image: torch.Tensor,
+    prompts: List[str],
+    box_threshold: float,
+    text_threshold: float,
+    device: str = "cuda",
+) -> List[Dict[str, Any]]:
+    """
+    One GroundingDINO forward pass for every target prompt.
+
+    Each query box is scored per target as its max logit over that target's caption
+    tokens, which is what a separate predict(caption=prompt) thresholds on. When a
+    target's full prompt yields nothing, its bare-noun phrase (a separate phrase of
+    the caption, see build_caption) is scored instead: the old per-target retry,
+    without a second forward.
+
+    Returns one {"boxes": [N,4] cxcywh normalized, "scores": [N], "fallback": bool}
+    per prompt, in the same format as groundingdino.util.inference.predict.
+    """
+    caption, prompt_spans, noun_spans = build_caption(prompts)
+    model = model.to(device)
+    with torch.no_grad():
+        outputs = model(image[None].to(device), captions=[caption])
+    logits = outputs["pred_logits"].cpu().sigmoid()[0]  # [nq, 256]
+    boxes = outputs["pred_boxes"].cpu()[0]              # [nq, 4] cxcywh
+
+    tokenized = model.tokenizer(caption)
+    results = []
+    for prompt, p_span, n_span in zip(prompts, prompt_spans, noun_spans):
+        res = None
+        spans = [(p_span, False)]
+        if n_span != p_span:
+            spans.append((n_span, True))
+        for span, is_fallback in spans:
+            toks = _span_tokens(tokenized, span)
+            if not toks:
+                continue
+            tok_logits = logits[:, toks]
+            scores = tok_logits.max(dim=1)[0]
+            keep = (scores > box_threshold) & (tok_logits > text_threshold).any(dim=1)
+            if keep.any():
+                res = {"boxes": boxes[keep].numpy(), "scores": scores[keep].numpy(), "fallback": is_fallback}
+                break
+        if res is None:
+            res = {"boxes": np.zeros((0, 4), dtype=np.float32), "scores": np.zeros((0,), dtype=np.float32),
+                   "fallback": False}
+        results.append(res)
+    return results
+
+
+# ---------- backbone reuse across captions ----------
+
+class BackboneCache:
+    """
+    Memoizes GroundingDINO's image backbone (Swin features + position encodings) for
+    the last image seen.
+
+    Only the backbone is caption-independent: the encoder's feature enhancer already
+    fuses text into the image tokens, so it runs again with the decoder for every new
+    caption. Per-target prompts, bare-noun retries and threshold sweeps on one image
+    thus pay for a single backbone pass. A hit needs an identical input tensor and
+    padding mask.
+    """
+
+    def __init__(self, backbone):
+        self._forward = backbone.forward
+        self._lock = threading.Lock()
+        self._key = None  # (tensors, mask) of the cached image
+        self._out = None
+        self.hits = self.misses = 0
+
+    def __call__(self, samples):
+        with self._lock:
+            if self._key is not None and _same_input(self._key, samples):
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._out = self._forward(samples)
+                self._key = (samples.tensors.detach().clone(), samples.mask.clone())
+            features, poss = self._out
+        # GroundingDINO appends its extra feature levels to these lists: hand out copies
+        return list(features), list(poss)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._key = self._out = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def _same_input(key, samples) -> bool:
+    tensors, mask = key
+    return (tensors.shape == samples.tensors.shape and tensors.device == samples.tensors.device
+            and torch.equal(tensors, samples.tensors) and torch.equal(mask, samples.mask))
+
+
+def enable_backbone_reuse(model) -> BackboneCache:
+    """Installs a BackboneCache on *model* (once) and returns it."""
+    cache = getattr(model, "_backbone_cache", None)
+    if cache is None:
+        cache = BackboneCache(model.backbone)
+        model.backbone.forward = cache  # instance attribute: nn.Module.__call__ picks it up
+        model._backbone_cache = cache
+    return cache
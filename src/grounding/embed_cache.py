@@ -0,0 +1,103 @@
+from __future__ import annotations
+import os
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+
+def image_digest(image_np: np.ndarray) -> str:
+    """Content hash of a decoded image (pixels + shape + dtype)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((image_np.shape, image_np.dtype.str)).encode())
+    h.update(np.ascontiguousarray(image_np).data)
+    return h.hexdigest()
+
+
+class SamEmbeddingCache:
+    """
+    On-disk cache of SAM image embeddings.
+
+    One .npy file per (image content, SAM variant, input resolution). Entries are
+    opened as read-only memory maps, and recency is tracked through the file mtime
+    (touched on every hit), so LRU eviction under *max_bytes* needs no index file
+    and survives restarts.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int = 2 << 30):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image_np: np.ndarray, variant: str, input_size: int) -> str:
+        return f"{image_digest(image_np)}_{variant}_{int(input_size)}"
+
+    def _path(self, key: str) -> Path:
+        return self.dir / f"{key}.npy"
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        p = self._path(key)
+        try:
+            arr = np.load(p, mmap_mode="r")
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(p)  # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return arr
+
+    def put(self, key: str, features: np.ndarray) -> None:
+        p = self._path(key)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        mm = np.lib.format.open_memmap(tmp, mode="w+", dtype=features.dtype, shape=features.shape)
+        mm[...] = features
+        mm.flush()
+        del mm
+        os.replace(tmp, p)
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits in *max_bytes*."""
+        with self._lock:
+            entries = []
+            for p in self.dir.glob("*.npy"):
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            total = sum(size for _, size, _ in entries)
+            for _, size, p in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    p.unlink()
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_CACHES: dict = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_embedding_cache(cache_dir: str, max_mb: int) -> Optional[SamEmbeddingCache]:
+    """Process-wide cache instance per directory (None when *cache_dir* is empty)."""
+    if not cache_dir:
+        return None
+    with _CACHES_LOCK:
+        key = os.path.abspath(cache_dir)
+        if key not in _CACHES:
+            _CACHES[key] = SamEmbeddingCache(cache_dir, max_bytes=int(max_mb) << 20)
+        return _CACHES[key]
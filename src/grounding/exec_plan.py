@@ -0,0 +1,68 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+# Operations whose target must already be visible in the image
+_EDITS_EXISTING = {"remove", "recolor", "replace", "move"}
+
+
+@dataclass
+class ExecutionPlan:
+    detect: List[int] = field(default_factory=list)          # plan.targets indices to ground
+    skipped: Dict[int, str] = field(default_factory=dict)    # index -> reason
+
+    def to_meta(self, plan) -> Dict:
+        return {
+            "detect": [plan.targets[i].name for i in self.detect],
+            "skipped": [{"name": plan.targets[i].name, "reason": r} for i, r in sorted(self.skipped.items())],
+        }
+
+
+def build_execution_plan(plan) -> ExecutionPlan:
+    """
+    Decides which plan targets grounding has to detect, from plan.ops and plan.relations.
+
+    - add: the added object does not exist yet, so only its references are detected
+      (relation partners, or every other target when there are no relations);
+    - remove / recolor / replace: the target itself, plus its relation partners
+      (needed to pick the right instance).
+    Without ops (or with an op type we don't know) every target is detected.
+    """
+    names = [t.name for t in plan.targets]
+    index: Dict[str, List[int]] = {}
+    for i, n in enumerate(names):
+        index.setdefault(n, []).append(i)
+
+    def partners(name: str) -> List[str]:
+        out = []
+        for r in plan.relations:
+            if r.subj == name:
+                out.append(r.obj)
+            elif r.obj == name:
+                out.append(r.subj)
+        return out
+
+    ops = [op for op in plan.ops if op.target in index]
+    if not ops or any(op.type not in _EDITS_EXISTING | {"add"} for op in ops):
+        return ExecutionPlan(detect=list(range(len(names))))
+
+    needed: set = set()
+    added: set = set()
+    for op in ops:
+        if op.type == "add":
+            added.add(op.target)
+            refs = partners(op.target) or [n for n in names if n != op.target]
+            needed.update(refs)
+        else:
+            needed.add(op.target)
+            needed.update(partners(op.target))
+
+    ep = ExecutionPlan()
+    for i, n in enumerate(names):
+        if n in needed:
+            ep.detect.append(i)
+        elif n in added:
+            ep.skipped[i] = "added by the edit (not in the image yet)"
+        else:
+            ep.skipped[i] = "not needed by any operation"
+    return ep
@@ -1,17 +1,30 @@
 # src/grounding/locate.py
 from __future__ import annotations
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Iterable, Iterator
+from dataclasses import dataclass, field
 from pathlib import Path
 import json
+import time
+import queue
+import threading
 import numpy as np
 import torch
 from PIL import Image
-from tempfile import NamedTemporaryFile
 
-from .models import load_grounding_cfg, try_load_groundingdino, try_load_sam
-from .boxes_masks import nms_xyxy, sam_masks_from_boxes
+from .models import load_grounding_cfg, get_groundingdino, get_sam, SamBackend
+from .boxes_masks import sam_masks_for_targets, sam_masks_with_policy, SamSession, LazySamMasks
+from .embed_cache import get_embedding_cache, image_digest
+from .detect import build_caption, predict_multi, enable_backbone_reuse
+from .preprocess import prepare_inputs, context_dino_tensor
+from .result_cache import get_result_cache
 from .visualize import draw_boxes, draw_masks
-from groundingdino.util.inference import predict, load_image
+from .masks import MaskList, RLEMask
+from .nms import batched_nms_xyxy
+from .tiling import iter_tiles, assign_windows, to_image_coords
+from .relations import prune_by_relations
+from .exec_plan import build_execution_plan
+from groundingdino.util.inference import predict
+from src.utils.image_context import ImageContext
 
 
 # ---------- helpers ----------
@@ -30,37 +43,225 @@ def _dummy_center_box(img: Image.Image) -> Tuple[int, int, int, int]:
     return (x1, y1, x1 + bw, y1 + bh)
 
 
-# ---------- main ----------
+def _predict_with_retry(dino, image_tensor, prompt: str, dcfg, device: str) -> Tuple[np.ndarray, np.ndarray]:
+    boxes, logits, phrases = predict(
+        model=dino,
+        image=image_tensor,
+        caption=prompt,
+        box_threshold=dcfg.box_threshold,
+        text_threshold=dcfg.text_threshold,
+        device=device,
+    )
 
-def locate_plan_aware(
-    img: Image.Image,
-    plan,
-    cfg_yml: dict,
+    boxes = _to_np(boxes)                 # [N,4], may be normalized
+    scores = _to_np(logits).reshape(-1)
+
+    # Retry with bare noun if attribute prompt gave nothing
+    if boxes.size == 0 and " " in prompt:
+        base = prompt.split()[-1]
+        boxes, logits, _ = predict(
+            model=dino, image=image_tensor, caption=base,
+            box_threshold=dcfg.box_threshold, text_threshold=dcfg.text_threshold, device=device,
+        )
+        boxes = _to_np(boxes)
+        scores = _to_np(logits).reshape(-1)
+    return boxes, scores
+
+def _to_pixel_xyxy(boxes: np.ndarray, scores: np.ndarray, W: int, H: int) -> Tuple[np.ndarray, np.ndarray]:
+    """DINO boxes -> pixel xyxy, clipped, degenerate boxes dropped."""
+    if boxes.size == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=np.float32)
+    # If <=1.5, treat as normalized; convert to pixel xyxy
+    if float(boxes.max()) <= 1.5:
+        xyxy = boxes * np.array([W, H, W, H], dtype=np.float32)  # assume normalized xyxy
+        # If degenerate for all, interpret as cxcywh
+        deg = (xyxy[:, 2] <= xyxy[:, 0]) | (xyxy[:, 3] <= xyxy[:, 1])
+        if deg.all():
+            cxcywh = boxes * np.array([W, H, W, H], dtype=np.float32)
+            x1y1 = cxcywh[:, :2] - cxcywh[:, 2:] / 2.0
+            x2y2 = cxcywh[:, :2] + cxcywh[:, 2:] / 2.0
+            xyxy = np.concatenate([x1y1, x2y2], axis=1)
+        # clip
+        xyxy[:, 0] = np.clip(xyxy[:, 0], 0, W - 1)
+        xyxy[:, 1] = np.clip(xyxy[:, 1], 0, H - 1)
+        xyxy[:, 2] = np.clip(xyxy[:, 2], 0, W - 1)
+        xyxy[:, 3] = np.clip(xyxy[:, 3], 0, H - 1)
+        boxes = xyxy.astype(np.float32)
+
+        # Filtrer les boîtes invalides (largeur ou hauteur <= 0)
+        valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        boxes = boxes[valid]
+        scores = scores[valid]
+    return boxes.astype(np.float32), scores.astype(np.float32)
+
+def _nms_and_cap(per_target: List[Tuple[np.ndarray, np.ndarray]], dcfg) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """One class-aware NMS over every target's boxes, then the per-target cap."""
+    if not per_target:
+        return []
+    boxes = np.concatenate([b for b, _ in per_target], axis=0)
+    scores = np.concatenate([s for _, s in per_target], axis=0)
+    idxs = np.concatenate([np.full(len(b), i, dtype=np.int64) for i, (b, _) in enumerate(per_target)])
+    keep = np.asarray(batched_nms_xyxy(boxes, scores, idxs, dcfg.nms_iou), dtype=np.int64)
+
+    out = []
+    for i in range(len(per_target)):
+        k = keep[idxs[keep] == i]  # still sorted by decreasing score
+        k = k[:dcfg.max_detections_per_target]
+        out.append((boxes[k], scores[k]))
+    return out
+
+
+def _relation_context(plan, i: int, prompts: List[str], gcfg) -> List[Any]:
+    """What target i's pruned boxes depend on besides its own prompt (for the result cache key)."""
+    if not gcfg.relations.prune:
+        return []
+    name = plan.targets[i].name
+    idx = {t.name: j for j, t in reversed(list(enumerate(plan.targets)))}
+    ctx = []
+    for r in plan.relations:
+        if name in (r.subj, r.obj):
+            ctx.append([r.subj, r.rel, r.obj] + [prompts[idx[n]] if n in idx else None for n in (r.subj, r.obj)])
+    return ctx + [gcfg.relations.min_score] if ctx else []
+
+def _detect_raw(dino, image_tensor, prompts: List[str], dcfg, device: str) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Raw DINO boxes/scores per prompt (normalized, as returned by predict)."""
+    if dcfg.single_pass:
+        # One forward for all targets (bare-noun fallback served from the same pass)
+        raw = predict_multi(
+            dino, image_tensor, prompts,
+            box_threshold=dcfg.box_threshold, text_threshold=dcfg.text_threshold,
+            device=device,
+        )
+        return [(r["boxes"], r["scores"]) for r in raw]
+    return [_predict_with_retry(dino, image_tensor, prompt, dcfg, device) for prompt in prompts]
+
+def _detect_tiled(dino, img: ImageContext, prompts: List[str], gcfg) -> Tuple[List[Tuple[np.ndarray, np.ndarray]], Dict[str, Any]]:
+    """
+    Detection over overlapping tiles, streamed one tile at a time (memory bounded by
+    the tile size). Boxes come back in full-image pixels, ready for the shared NMS.
+    """
+    W, H = img.size
+    tcfg = gcfg.tiling
+    boxes_acc: List[List[np.ndarray]] = [[] for _ in prompts]
+    scores_acc: List[List[np.ndarray]] = [[] for _ in prompts]
+    tiles = []
+    for (x0, y0, x1, y1) in iter_tiles(W, H, tcfg.tile, tcfg.overlap):
+        t0 = time.perf_counter()
+        tile_tensor = prepare_inputs(img.crop((x0, y0, x1, y1))).dino  # crop shares the context's pixels
+        raw = _detect_raw(dino, tile_tensor, prompts, gcfg.dino, gcfg.device)
+        n = 0
+        for i, (b, sc) in enumerate(raw):
+            b, sc = _to_pixel_xyxy(b, sc, x1 - x0, y1 - y0)
+            boxes_acc[i].append(to_image_coords(b, (x0, y0, x1, y1)))
+            scores_acc[i].append(sc)
+            n += len(b)
+        tiles.append({"window": [x0, y0, x1, y1], "detect_s": round(time.perf_counter() - t0, 4), "boxes": n})
+
+    per_target = [(np.concatenate(b, axis=0), np.concatenate(sc, axis=0)) for b, sc in zip(boxes_acc, scores_acc)]
+    return per_target, {"tile": tcfg.tile, "overlap": tcfg.overlap, "tiles": tiles}
+
+def _segment_tiled(predictor, image_np: np.ndarray, targets: List[Dict[str, Any]], gcfg, embed_cache,
+                   variant: str | None = None) -> List[Dict[str, Any]]:
+    """
+    SAM only on the windows that hold kept boxes; each crop's masks are RLE-encoded
+    straight into full-image coordinates. Returns per-window timing.
+    """
+    H, W = image_np.shape[:2]
+    flat = [(ti, bi, b) for ti, t in enumerate(targets) for bi, b in enumerate(t["boxes"])]
+    windows, owner = assign_windows([b for _, _, b in flat], W, H, gcfg.tiling.tile, gcfg.tiling.overlap)
+    rles: Dict[Tuple[int, int], RLEMask] = {}
+    timings = []
+    for wi, (x0, y0, x1, y1) in enumerate(windows):
+        members = [flat[k] for k in range(len(flat)) if owner[k] == wi]
+        t0 = time.perf_counter()
+        local = np.array([b for _, _, b in members], dtype=np.float32) - np.array([x0, y0, x0, y0], dtype=np.float32)
+        masks = sam_masks_for_targets(predictor, image_np[y0:y1, x0:x1], [local],
+                                      embed_cache=embed_cache, variant=variant or gcfg.sam.variant)[0]
+        for (ti, bi, _), m in zip(members, masks):
+            rles[(ti, bi)] = RLEMask.from_crop(m, (x0, y0), (H, W))
+        timings.append({"window": [x0, y0, x1, y1], "sam_s": round(time.perf_counter() - t0, 4), "boxes": len(members)})
+
+    for ti, t in enumerate(targets):
+        n = len(t["boxes"])
+        t["masks"] = MaskList([rles[(ti, bi)] for bi in range(n)]) if n > 0 else None
+    return timings
+
+def _attach_lazy_masks(predictor, image_np: np.ndarray, targets: List[Dict[str, Any]], gcfg, embed_cache,
+                       tiled: bool, variant: str | None = None) -> None:
+    """Gives each target a LazySamMasks; one SamSession per image (or per SAM window when tiled)."""
+    H, W = image_np.shape[:2]
+    variant = variant or gcfg.sam.variant
+    if not tiled:
+        session = SamSession(predictor, image_np, embed_cache, variant)
+        for t in targets:
+            t["masks"] = LazySamMasks([(session, np.asarray(b, dtype=np.float32)) for b in t["boxes"]])
+        return
+
+    flat = [(ti, b) for ti, t in enumerate(targets) for b in t["boxes"]]
+    windows, owner = assign_windows([b for _, b in flat], W, H, gcfg.tiling.tile, gcfg.tiling.overlap)
+    sessions = [
+        SamSession(predictor, image_np[y0:y1, x0:x1], embed_cache, variant, offset=(x0, y0), full_size=(H, W))
+        for (x0, y0, x1, y1) in windows
+    ]
+    entries: List[List[Tuple[SamSession, np.ndarray]]] = [[] for _ in targets]
+    for (ti, b), wi in zip(flat, owner):
+        x0, y0 = windows[wi][:2]
+        entries[ti].append((sessions[wi], np.asarray(b, dtype=np.float32) - np.array([x0, y0, x0, y0], dtype=np.float32)))
+    for t, e in zip(targets, entries):
+        t["masks"] = LazySamMasks(e)
+
+
+# ---------- stages ----------
+
+@dataclass
+class _Job:
+    """One image moving through detect -> segment -> finish."""
+    img: ImageContext
+    plan: Any
+    gcfg: Any
     save_debug_dir: Path | None = None
-) -> Dict[str, Any]:
+    predictor: Any = None
+    sam_backend: Any = None   # SamBackend when the SAM size policy is on (predictor unused)
+    inputs: Any = None
+    tiled: bool = False
+    targets: List[Dict[str, Any]] = field(default_factory=list)
+    meta: Dict[str, Any] = field(default_factory=dict)
+    todo: List[int] = field(default_factory=list)
+    keys: List[str] = field(default_factory=list)
+    rcache: Any = None
+    fallback: Dict[str, Any] | None = None  # set when DINO is unavailable
 
-    gcfg = load_grounding_cfg(cfg_yml)
+
+def _stage_detect(img: Image.Image | ImageContext, plan, gcfg, save_debug_dir: Path | None = None) -> _Job:
+    """Model lookup, result-cache lookup, GroundingDINO and relation pruning."""
     device = gcfg.device
+    img = ImageContext.of(img)
+    job = _Job(img=img, plan=plan, gcfg=gcfg, save_debug_dir=save_debug_dir)
 
-    # Load models (graceful on failure)
-    dino, err_dino = try_load_groundingdino(gcfg.dino, device)
-    sam, predictor, err_sam = try_load_sam(gcfg.sam, device)
+    # Load models once per process (graceful on failure)
+    onnx = gcfg.onnx if gcfg.backend == "onnx" else None
+    dino, err_dino, dino_info = get_groundingdino(gcfg.dino, device, onnx)
+    if gcfg.sam.policy.enabled and gcfg.sam.backends:
+        # SAM size picked per request in _stage_segment; variants load on first use
+        job.sam_backend = SamBackend(gcfg.sam, device, onnx)
+        err_sam, sam_info = None, {"policy": [b.variant for b in gcfg.sam.backends]}
+    else:
+        sam, predictor, err_sam, sam_info = get_sam(gcfg.sam, device, onnx)
+        job.predictor = predictor
+    models_meta = {"backend": gcfg.backend, "dino": dino_info, "sam": sam_info}
 
     if dino is None:
         box = _dummy_center_box(img)
-        if save_debug_dir:
-            (save_debug_dir / "GROUNDING_FALLBACK.txt").write_text(f"{err_dino}\n{err_sam or ''}")
-            draw_boxes(img, [box], labels=["dummy"]).save(save_debug_dir / "grounding_preview.jpg")
-        return {
-            "targets": [{
-                "name": plan.targets[0].name if plan.targets else "object",
-                "prompt": "fallback",
-                "boxes": [list(map(int, box))],
-                "scores": [1.0],
-                "masks": None
-            }],
-            "meta": {"fallback": True, "errors": {"dino": err_dino, "sam": err_sam}}
-        }
+        job.fallback = {"box": box, "errors": (err_dino, err_sam)}
+        job.targets = [{
+            "name": plan.targets[0].name if plan.targets else "object",
+            "prompt": "fallback",
+            "boxes": [list(map(int, box))],
+            "scores": [1.0],
+            "masks": None
+        }]
+        job.meta = {"fallback": True, "errors": {"dino": err_dino, "sam": err_sam}, "models": models_meta}
+        return job
 
     # Prompts from plan
     text_prompts, target_names = [], []
@@ -68,94 +269,153 @@ def locate_plan_aware(
         text_prompts.append((f"{' '.join(t.attributes)} {t.name}").strip() if t.attributes else t.name)
         target_names.append(t.name)
 
-    # DINO preproc (expects a file path)
-    with NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-        img.convert("RGB").save(tmp.name, "JPEG")
-        temp_path = tmp.name
+    W, H = img.size
+    job.tiled = tiled = gcfg.tiling.enabled and max(W, H) > gcfg.tiling.min_side
 
-    # We only use the returned tensor; for width/height we rely on *img*
-    _, image_tensor = load_image(temp_path)
-    W, H = img.size  # <— FIX: get size from the original PIL image
+    # DINO + SAM inputs built in memory from a single RGB conversion
+    # (the full-image DINO tensor is only built if something actually needs detecting)
+    job.inputs = inputs = prepare_inputs(img, with_dino=False)
+    job.meta = meta = {"fallback": False, "models": models_meta}
 
-    all_targets: List[Dict[str, Any]] = []
+    # Operation-aware plan: objects an "add" will create are not looked for
+    exec_plan = build_execution_plan(plan)
+    meta["execution_plan"] = exec_plan.to_meta(plan)
+    # single pass: one DINO call for all targets, saved only when every target is skipped.
+    # Per target: one call per skipped prompt, plus a bare-noun retry it might have needed
+    if gcfg.dino.single_pass:
+        saved, retries = int(bool(exec_plan.skipped) and not exec_plan.detect), 0
+    else:
+        saved = len(exec_plan.skipped)
+        retries = sum(" " in text_prompts[i].strip() for i in exec_plan.skipped)
+    meta["execution_plan"]["detector_calls_saved"] = saved
+    meta["execution_plan"]["detector_retries_saved_max"] = retries
 
-    for i, prompt in enumerate(text_prompts):
-        boxes, logits, phrases = predict(
-            model=dino,
-            image=image_tensor,
-            caption=prompt,
-            box_threshold=gcfg.dino.box_threshold,
-            text_threshold=gcfg.dino.text_threshold
-        )
+    # Result cache: targets already grounded on this image skip DINO and SAM
+    job.rcache = rcache = get_result_cache(gcfg.result_cache)
+    cached: List[Dict[str, Any] | None] = [None] * len(text_prompts)
+    if rcache is not None:
+        image_hash = img.derive("digest", lambda c: image_digest(c.rgb_np))
+        # single pass: a target's boxes also depend on the other phrases of the combined caption
+        caption = [build_caption([text_prompts[i] for i in exec_plan.detect])[0]] if gcfg.dino.single_pass else []
+        job.keys = [rcache.key(image_hash, p, gcfg, tiled, _relation_context(plan, i, text_prompts, gcfg) + caption)
+                    for i, p in enumerate(text_prompts)]
+        cached = [rcache.get(k) if i in exec_plan.detect else None for i, k in enumerate(job.keys)]
+        if caption and any(cached[i] is None for i in exec_plan.detect):
+            cached = [None] * len(text_prompts)  # rerun the whole caption: a partial one would change the boxes
+        meta["result_cache"] = {
+            "hits": sum(c is not None for c in cached),
+            "misses": sum(cached[i] is None for i in exec_plan.detect),
+            "hit_targets": [target_names[i] for i, c in enumerate(cached) if c is not None],
+        }
+    job.todo = todo = [i for i in exec_plan.detect if cached[i] is None]
+    todo_prompts = [text_prompts[i] for i in todo]
 
-        boxes = _to_np(boxes)                 # [N,4], may be normalized
-        scores = _to_np(logits).reshape(-1)
+    job.targets = all_targets = [
+        {"name": target_names[i], "prompt": text_prompts[i], "boxes": [], "scores": [], "masks": None}
+        for i in range(len(text_prompts))
+    ]
+    for t, c in zip(all_targets, cached):
+        if c is not None:
+            t.update(boxes=c["boxes"], scores=c["scores"], masks=c["masks"])
 
-        # Retry with bare noun if attribute prompt gave nothing
-        if boxes.size == 0 and " " in prompt:
-            base = prompt.split()[-1]
-            boxes, logits, _ = predict(
-                model=dino, image=image_tensor, caption=base,
-                box_threshold=gcfg.dino.box_threshold, text_threshold=gcfg.dino.text_threshold
-            )
-            boxes = _to_np(boxes)
-            scores = _to_np(logits).reshape(-1)
-
-        if boxes.size > 0:
-            # If <=1.5, treat as normalized; convert to pixel xyxy
-            if float(boxes.max()) <= 1.5:
-                xyxy = boxes * np.array([W, H, W, H], dtype=np.float32)  # assume normalized xyxy
-                # If degenerate for all, interpret as cxcywh
-                deg = (xyxy[:, 2] <= xyxy[:, 0]) | (xyxy[:, 3] <= xyxy[:, 1])
-                if deg.all():
-                    cxcywh = boxes * np.array([W, H, W, H], dtype=np.float32)
-                    x1y1 = cxcywh[:, :2] - cxcywh[:, 2:] / 2.0
-                    x2y2 = cxcywh[:, :2] + cxcywh[:, 2:] / 2.0
-                    xyxy = np.concatenate([x1y1, x2y2], axis=1)
-                # clip
-                xyxy[:, 0] = np.clip(xyxy[:, 0], 0, W - 1)
-                xyxy[:, 1] = np.clip(xyxy[:, 1], 0, H - 1)
-                xyxy[:, 2] = np.clip(xyxy[:, 2], 0, W - 1)
-                xyxy[:, 3] = np.clip(xyxy[:, 3], 0, H - 1)
-                boxes = xyxy.astype(np.float32)
-                
-                # Filtrer les boîtes invalides (largeur ou hauteur <= 0)
-                valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
-                boxes = boxes[valid]
-                scores = scores[valid]
-
-            # NMS + per-target cap
-            if len(boxes) > 0:
-                keep = nms_xyxy(boxes, scores, gcfg.dino.nms_iou)
-            else:
-                keep = np.array([], dtype=np.int32)
-            boxes = boxes[keep]
-            scores = scores[keep]
-            if len(boxes) > gcfg.dino.max_detections_per_target:
-                order = np.argsort(scores)[::-1][:gcfg.dino.max_detections_per_target]
-                boxes = boxes[order]
-                scores = scores[order]
+    fresh = [all_targets[i] for i in todo]
+    if todo_prompts:
+        backbone = enable_backbone_reuse(dino) if gcfg.dino.reuse_backbone and onnx is None else None
+        before = backbone.stats() if backbone is not None else None
+        if tiled:
+            per_target, meta["tiling"] = _detect_tiled(dino, img, todo_prompts, gcfg)
         else:
-            boxes = np.zeros((0, 4), dtype=np.float32)
-            scores = np.zeros((0,), dtype=np.float32)
-
-        all_targets.append({
-            "name": target_names[i],
-            "prompt": prompt,
-            "boxes": boxes.astype(np.int32).tolist(),
-            "scores": scores.astype(float).tolist(),
-            "masks": None
-        })
+            inputs.dino = context_dino_tensor(img)
+            raw = _detect_raw(dino, inputs.dino, todo_prompts, gcfg.dino, device)
+            per_target = [_to_pixel_xyxy(b, s, W, H) for b, s in raw]
+
+        if backbone is not None:
+            # one backbone pass per image (per tile when tiled); free the features now
+            after = backbone.stats()
+            meta["models"]["dino_backbone"] = {k: after[k] - before[k] for k in after}
+            backbone.clear()
+
+        final = _nms_and_cap(per_target, gcfg.dino)
+        for t, (boxes, scores) in zip(fresh, final):
+            t["boxes"] = boxes.astype(np.int32).tolist()
+            t["scores"] = scores.astype(float).tolist()
+
+    # Relation-driven pruning: boxes that break plan.relations never reach SAM
+    if gcfg.relations.prune and plan.relations and fresh:
+        keep, decisions = prune_by_relations(plan.relations, all_targets, todo, gcfg.relations.min_score)
+        for i in todo:
+            t = all_targets[i]
+            t["boxes"] = [t["boxes"][k] for k in keep[i]]
+            t["scores"] = [t["scores"][k] for k in keep[i]]
+        meta["relations"] = decisions
+    return job
+
+
+def _stage_segment(job: _Job) -> _Job:
+    """SAM masks for the freshly detected targets, then the result-cache write."""
+    if job.fallback is not None:
+        return job
+    gcfg, predictor, backend = job.gcfg, job.predictor, job.sam_backend
+    # Fresh targets, plus cache hits stored without masks (lazy masks are never cached)
+    fresh = [t for t in job.targets if t["masks"] is None and len(t["boxes"]) > 0]
 
     # SAM masks (if available)
-    if predictor is not None:
-        image_np = np.array(img.convert("RGB"))
-        for t in all_targets:
-            if len(t["boxes"]) == 0:
-                t["masks"] = None
-                continue
-            masks = sam_masks_from_boxes(predictor, image_np, np.array(t["boxes"], dtype=np.float32))
-            t["masks"] = masks  # boolean [N,H,W]
+    if (predictor is not None or backend is not None) and fresh:
+        embed_cache = get_embedding_cache(gcfg.sam.embedding_cache_dir, gcfg.sam.embedding_cache_mb)
+        boxes = [np.array(t["boxes"], dtype=np.float32) for t in fresh]
+        variant = gcfg.sam.variant
+        if backend is not None and (gcfg.sam.lazy or job.tiled):
+            # No per-mask escalation on these paths: the policy only picks the size
+            variant = backend.choose(np.concatenate(boxes), job.inputs.rgb_np.shape[:2])[0]
+            predictor = backend.predictor(variant)
+            job.meta["models"]["sam_policy"] = {"order": [variant], "models": backend.info}
+
+        per_target = None
+        if backend is not None and predictor is None:
+            if not (gcfg.sam.lazy or job.tiled):
+                # Size picked from the boxes, low-IoU masks escalated to larger variants
+                per_target, job.meta["models"]["sam_policy"] = sam_masks_with_policy(
+                    backend, job.inputs.rgb_np, boxes, embed_cache=embed_cache)
+        elif gcfg.sam.lazy:
+            # Handles only: SAM runs when (and for the boxes that) the editor reads a mask
+            _attach_lazy_masks(predictor, job.inputs.rgb_np, fresh, gcfg, embed_cache, job.tiled, variant)
+        elif job.tiled:
+            job.meta.setdefault("tiling", {})["sam_windows"] = _segment_tiled(
+                predictor, job.inputs.rgb_np, fresh, gcfg, embed_cache, variant)
+        else:
+            # One image embedding, all boxes of all targets in a single decoder batch
+            per_target = sam_masks_for_targets(
+                predictor, job.inputs.rgb_np, boxes, embed_cache=embed_cache, variant=variant,
+            )
+        if per_target is not None:
+            for t, masks in zip(fresh, per_target):
+                # compact RLE; masks[i] decodes to a boolean [H,W] on demand
+                t["masks"] = MaskList.from_dense(masks) if len(masks) > 0 else None
+        if embed_cache is not None:
+            job.meta["models"]["sam_embedding_cache"] = embed_cache.stats()
+
+    if job.rcache is not None:
+        for i in job.todo:
+            t = job.targets[i]
+            masks = None if isinstance(t["masks"], LazySamMasks) else t["masks"]
+            job.rcache.put(job.keys[i], t["boxes"], t["scores"], masks)
+        job.meta["result_cache"]["totals"] = job.rcache.stats()
+    if job.inputs is not None:
+        job.inputs.ctx.release("dino")  # the editors never need the DINO tensor
+    job.inputs = None  # drop decoded pixels / tensors before the job is queued further
+    return job
+
+
+def _stage_finish(job: _Job) -> Dict[str, Any]:
+    """Debug artifacts, then the public result dict."""
+    img, save_debug_dir, all_targets = job.img, job.save_debug_dir, job.targets
+
+    if job.fallback is not None:
+        if save_debug_dir:
+            err_dino, err_sam = job.fallback["errors"]
+            (save_debug_dir / "GROUNDING_FALLBACK.txt").write_text(f"{err_dino}\n{err_sam or ''}")
+            draw_boxes(img, [job.fallback["box"]], labels=["dummy"]).save(save_debug_dir / "grounding_preview.jpg")
+        return {"targets": all_targets, "meta": job.meta}
 
     # Debug artifacts
     if save_debug_dir:
@@ -165,16 +425,124 @@ def locate_plan_aware(
                     img, t["boxes"],
                     labels=[f"{t['name']}:{i}" for i in range(len(t["boxes"]))]
                 ).save(save_debug_dir / f"boxes_{t['name']}.jpg")
-            if isinstance(t.get("masks"), np.ndarray) and t["masks"].size > 0:
+            # no preview for lazy masks: drawing them would run SAM on every box
+            if t.get("masks") is not None and len(t["masks"]) > 0 and not isinstance(t["masks"], LazySamMasks):
                 draw_masks(img, t["masks"]).save(save_debug_dir / f"masks_{t['name']}.jpg")
 
         (save_debug_dir / "targets.json").write_text(
             json.dumps([
                 {
                     **{k: v for k, v in t.items() if k != "masks"},
-                    "masks": None if t.get("masks") is None else [m.shape for m in t["masks"]]
+                    "masks": None if t.get("masks") is None else [list(t["masks"].shape[1:])] * len(t["masks"])
                 } for t in all_targets
             ], indent=2)
         )
 
-    return {"targets": all_targets, "meta": {"fallback": False}}
+    return {"targets": all_targets, "meta": job.meta}
+
+
+# ---------- main ----------
+
+def locate_plan_aware(
+    img: Image.Image | ImageContext,
+    plan,
+    cfg_yml: dict,
+    save_debug_dir: Path | None = None
+) -> Dict[str, Any]:
+
+    gcfg = load_grounding_cfg(cfg_yml)
+    job = _stage_detect(img, plan, gcfg, save_debug_dir)
+    job = _stage_segment(job)
+    return _stage_finish(job)
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+_END = object()
+
+
+def locate_stream(
+    items: Iterable,
+    cfg_yml: dict,
+    queue_size: int = 2,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Pipelined locate_plan_aware over many images.
+
+    *items* yields (image, plan) or (image, plan, save_debug_dir). GroundingDINO runs
+    on image N+1 while SAM works on image N and the debug artifacts of image N-1 are
+    written, each stage on its own thread. Bounded queues (*queue_size*) cap how many
+    decoded images are in flight. Results are yielded in input order and are the same
+    as calling locate_plan_aware on each item; an exception is re-raised at the item
+    that caused it.
+    """
+    gcfg = load_grounding_cfg(cfg_yml)
+    stop = threading.Event()
+    q_seg: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    q_fin: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    q_out: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+    def put(q, x) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(x, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def detect_worker():
+        try:
+            for item in items:
+                img, plan, *rest = item
+                try:
+                    out = _stage_detect(img, plan, gcfg, rest[0] if rest else None)
+                except Exception as e:
+                    out = _Failed(e)
+                if not put(q_seg, out):
+                    return
+        except Exception as e:  # the input iterator itself failed
+            put(q_seg, _Failed(e))
+        put(q_seg, _END)
+
+    def stage_worker(fn, src, dst):
+        while True:
+            job = get(src)
+            if job is _END:
+                put(dst, _END)
+                return
+            if not isinstance(job, _Failed):
+                try:
+                    job = fn(job)
+                except Exception as e:
+                    job = _Failed(e)
+            if not put(dst, job):
+                return
+
+    threads = [
+        threading.Thread(target=detect_worker, name="ground-detect", daemon=True),
+        threading.Thread(target=stage_worker, args=(_stage_segment, q_seg, q_fin), name="ground-segment", daemon=True),
+        threading.Thread(target=stage_worker, args=(_stage_finish, q_fin, q_out), name="ground-finish", daemon=True),
+    ]
+    for th in threads:
+        th.start()
+    try:
+        while True:
+            res = q_out.get()
+            if res is _END:
+                return
+            if isinstance(res, _Failed):
+                raise res.exc
+            yield res
+    finally:
+        stop.set()
@@ -0,0 +1,251 @@
+from __future__ import annotations
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
+
+
+# ---------- single mask ----------
+
+class RLEMask:
+    """
+    Binary mask stored as run lengths over the row-major flattened image.
+
+    counts alternate background / foreground runs and always start with a
+    background run (possibly 0), as in COCO RLE. Area, bbox, boolean ops and
+    inversion work on the runs directly; decode() is only needed for pixels.
+    """
+
+    __slots__ = ("size", "counts")
+
+    def __init__(self, size: Tuple[int, int], counts: np.ndarray):
+        self.size = (int(size[0]), int(size[1]))  # (H, W)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    # --- construction ---
+
+    @classmethod
+    def encode(cls, mask: np.ndarray) -> "RLEMask":
+        mask = np.asarray(mask, dtype=bool)
+        flat = mask.ravel()
+        if flat.size == 0:
+            return cls(mask.shape, np.zeros(1, dtype=np.int64))
+        change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+        bounds = np.concatenate([[0], change, [flat.size]])
+        counts = np.diff(bounds)
+        if flat[0]:
+            counts = np.concatenate([[0], counts])
+        return cls(mask.shape, counts)
+
+    @classmethod
+    def from_crop(cls, crop: np.ndarray, offset: Tuple[int, int], size: Tuple[int, int]) -> "RLEMask":
+        """Encodes a mask computed on a crop at *offset* (x0, y0) of a *size* (H, W) image,
+        without materialising the full-size mask."""
+        crop = np.asarray(crop, dtype=bool)
+        h, w = crop.shape
+        x0, y0 = offset
+        padded = np.zeros((h, w + 2), dtype=np.int8)
+        padded[:, 1:-1] = crop
+        d = np.diff(padded, axis=1)
+        rs, cs = np.nonzero(d == 1)
+        re, ce = np.nonzero(d == -1)  # same row order as the starts
+        W = size[1]
+        starts = (y0 + rs) * W + x0 + cs
+        ends = (y0 + re) * W + x0 + ce
+        return cls._from_intervals(size, starts, ends)
+
+    @classmethod
+    def _from_intervals(cls, size, starts: np.ndarray, ends: np.ndarray) -> "RLEMask":
+        """Foreground intervals [start, end) (sorted, non-overlapping) -> RLE."""
+        n = size[0] * size[1]
+        if len(starts) == 0:
+            return cls(size, np.array([n], dtype=np.int64))
+        bounds = np.empty(2 * len(starts) + 2, dtype=np.int64)
+        bounds[0], bounds[-1] = 0, n
+        bounds[1:-1:2], bounds[2:-1:2] = starts, ends
+        return cls(size, np.diff(bounds))
+
+    # --- views ---
+
+    def intervals(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Foreground runs as [start, end) flat indices."""
+        ends = np.cumsum(self.counts)
+        starts = ends - self.counts
+        fg = slice(1, None, 2)
+        s, e = starts[fg], ends[fg]
+        keep = e > s
+        return s[keep], e[keep]
+
+    def decode(self) -> np.ndarray:
+        values = np.zeros(len(self.counts), dtype=bool)
+        values[1::2] = True
+        return np.repeat(values, self.counts).reshape(self.size)
+
+    # --- measurements ---
+
+    def area(self) -> int:
+        return int(self.counts[1::2].sum())
+
+    def bbox(self) -> Tuple[int, int, int, int] | None:
+        """Tight (x1, y1, x2, y2) box, inclusive, or None for an empty mask."""
+        s, e = self.intervals()
+        if len(s) == 0:
+            return None
+        W = self.size[1]
+        r0, r1 = s // W, (e - 1) // W
+        multi = r1 > r0  # run wraps onto the next row(s): touches both image edges
+        x1 = np.where(multi, 0, s % W).min()
+        x2 = np.where(multi, W - 1, (e - 1) % W).max()
+        return int(x1), int(r0.min()), int(x2), int(r1.max())
+
+    # --- boolean algebra ---
+
+    def _combine(self, other: "RLEMask", op) -> "RLEMask":
+        if self.size != other.size:
+            raise ValueError(f"RLE size mismatch: {self.size} vs {other.size}")
+        a_s, a_e = self.intervals()
+        b_s, b_e = other.intervals()
+        # Every segment between consecutive boundaries has a constant value in both masks
+        pts = np.unique(np.concatenate([[0, self.size[0] * self.size[1]], a_s, a_e, b_s, b_e]))
+        seg = pts[:-1]
+        in_a = (np.searchsorted(a_s, seg, side="right") - np.searchsorted(a_e, seg, side="right")) > 0
+        in_b = (np.searchsorted(b_s, seg, side="right") - np.searchsorted(b_e, seg, side="right")) > 0
+        on = op(in_a, in_b)
+        # Merge adjacent "on" segments into runs
+        d = np.diff(np.concatenate([[False], on, [False]]).astype(np.int8))
+        starts = pts[np.flatnonzero(d == 1)]
+        ends = pts[np.flatnonzero(d == -1)]
+        return RLEMask._from_intervals(self.size, starts, ends)
+
+    def __and__(self, other: "RLEMask") -> "RLEMask":
+        return self._combine(other, np.logical_and)
+
+    def __or__(self, other: "RLEMask") -> "RLEMask":
+        return self._combine(other, np.logical_or)
+
+    def __invert__(self) -> "RLEMask":
+        if len(self.counts) and self.counts[0] == 0:
+            return RLEMask(self.size, self.counts[1:])
+        return RLEMask(self.size, np.concatenate([[0], self.counts]))
+
+    def iou(self, other: "RLEMask") -> float:
+        inter = (self & other).area()
+        union = self.area() + other.area() - inter
+        return inter / union if union > 0 else 0.0
+
+    # --- (de)serialisation ---
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"size": list(self.size), "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_json(cls, d: Dict[str, Any]) -> "RLEMask":
+        return cls(tuple(d["size"]), np.asarray(d["counts"], dtype=np.int64))
+
+    def __repr__(self) -> str:
+        return f"RLEMask(size={self.size}, area={self.area()})"
+
+
+# ---------- per-target set of masks ----------
+
+class MaskList(Sequence):
+    """
+    Compact replacement for the dense boolean [N, H, W] array a target used to carry.
+
+    Indexing / iterating yields dense [H, W] bool arrays decoded on demand (so
+    masks[0] and ~masks[0] keep working for the editors); rle(i) gives the
+    compact form.
+    """
+
+    def __init__(self, rles: List[RLEMask]):
+        self.rles = list(rles)
+
+    @classmethod
+    def from_dense(cls, masks: np.ndarray) -> "MaskList":
+        return cls([RLEMask.encode(m) for m in masks])
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        H, W = self.rles[0].size if self.rles else (0, 0)
+        return (len(self.rles), H, W)
+
+    def __len__(self) -> int:
+        return len(self.rles)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return MaskList(self.rles[i])
+        return self.rles[i].decode()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for r in self.rles:
+            yield r.decode()
+
+    def rle(self, i: int) -> RLEMask:
+        return self.rles[i]
+
+    def to_dense(self) -> np.ndarray:
+        N, H, W = self.shape
+        out = np.zeros((N, H, W), dtype=bool)
+        for i, r in enumerate(self.rles):
+            out[i] = r.decode()
+        return out
+
+    def areas(self) -> List[int]:
+        return [r.area() for r in self.rles]
+
+    def bboxes(self) -> List[Tuple[int, int, int, int] | None]:
+        return [r.bbox() for r in self.rles]
+
+    def union(self) -> RLEMask | None:
+        if not self.rles:
+            return None
+        out = self.rles[0]
+        for r in self.rles[1:]:
+            out = out | r
+        return out
+
+    def nbytes(self) -> int:
+        return sum(r.counts.nbytes for r in self.rles)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"format": "rle", "masks": [r.to_json() for r in self.rles]}
+
+    @classmethod
+    def from_json(cls, d: Dict[str, Any]) -> "MaskList":
+        # A lazy list stores None for masks nobody read: keep the leading ones, so
+        # masks[i] still matches boxes[i]
+        rles = []
+        for m in d.get("masks", []):
+            if m is None:
+                break
+            rles.append(RLEMask.from_json(m))
+        return cls(rles)
+
+    def __repr__(self) -> str:
+        return f"MaskList(shape={self.shape}, nbytes={self.nbytes()})"
+
+
+# ---------- grounding artifacts ----------
+
+def grounding_to_json(g_out: Dict[str, Any]) -> Dict[str, Any]:
+    """locate_plan_aware output -> JSON-able dict, masks kept as RLE (lazy masks only if already read)."""
+    targets = []
+    for t in g_out.get("targets", []):
+        t = dict(t)
+        m = t.get("masks")
+        if isinstance(m, np.ndarray):
+            m = MaskList.from_dense(m)
+        t["masks"] = m.to_json() if isinstance(m, MaskList) else None
+        targets.append(t)
+    return {"meta": g_out.get("meta", {}), "targets": targets}
+
+
+def grounding_from_json(d: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of grounding_to_json: masks come back as MaskList (no SAM re-run)."""
+    targets = []
+    for t in d.get("targets", []):
+        t = dict(t)
+        if isinstance(t.get("masks"), dict):
+            t["masks"] = MaskList.from_json(t["masks"])
+        targets.append(t)
+    return {"meta": d.get("meta", {}), "targets": targets}
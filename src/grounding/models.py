@@ -1,8 +1,10 @@
 # src/grounding/models.py
 from __future__ import annotations
 import os
-from dataclasses import dataclass
-from typing import Optional
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Tuple
 import torch
 
 @dataclass
@@ -13,24 +15,83 @@ class DinoCfg:
     text_threshold: float
     nms_iou: float
     max_detections_per_target: int
+    single_pass: bool = False  # one combined caption / forward for all targets
+    reuse_backbone: bool = True  # one Swin backbone pass per image across captions/retries
+
+@dataclass
+class SamVariantCfg:
+    variant: str          # "vit_t" (MobileSAM) | "vit_b" | "vit_l" | "vit_h"
+    ckpt: str
+    latency_ms: float = 0.0  # measured encoder + decoder time per image on the serving device
+
+@dataclass
+class SamPolicyCfg:
+    enabled: bool = False
+    latency_budget_ms: float = 0.0  # 0 = no budget
+    small_box_px: float = 48.0   # shorter box side at SAM's input size below this -> largest variant
+    large_box_px: float = 192.0  # ... above this -> smallest variant
+    min_iou: float = 0.85        # boxes whose predicted IoU is below this escalate to the next variant
 
 @dataclass
 class SamCfg:
     ckpt: str
-    variant: str  # "vit_h" | "vit_l" | "vit_b"
+    variant: str  # "vit_h" | "vit_l" | "vit_b" | "vit_t"
+    embedding_cache_dir: str = ""   # empty = no on-disk embedding cache
+    embedding_cache_mb: int = 2048
+    lazy: bool = False   # masks decoded by SAM only when read (see LazySamMasks)
+    backends: List[SamVariantCfg] = field(default_factory=list)  # smallest first, for the policy
+    policy: SamPolicyCfg = field(default_factory=SamPolicyCfg)
+
+@dataclass
+class TilingCfg:
+    enabled: bool = False
+    tile: int = 1024      # tile side in pixels (detection and SAM windows)
+    overlap: int = 256
+    min_side: int = 2048  # only tile images whose longest side exceeds this
+
+@dataclass
+class ResultCacheCfg:
+    enabled: bool = False
+    mem_items: int = 256
+    dir: str = ""       # empty = memory level only
+    max_mb: int = 512
+
+@dataclass
+class RelationsCfg:
+    prune: bool = True       # drop boxes that break plan.relations before SAM
+    min_score: float = 0.5
+
+@dataclass
+class OnnxCfg:
+    dir: str = "weights/onnx"   # where scripts/export_onnx.py writes the graphs
+    threads: int = 0            # onnxruntime intra-op threads (0 = library default)
 
 @dataclass
 class GroundingCfg:
     device: str
     dino: DinoCfg
     sam: SamCfg
+    backend: str = "torch"      # "torch" | "onnx" (onnxruntime, CPU)
+    onnx: OnnxCfg = field(default_factory=OnnxCfg)
+    tiling: TilingCfg = field(default_factory=TilingCfg)
+    result_cache: ResultCacheCfg = field(default_factory=ResultCacheCfg)
+    relations: RelationsCfg = field(default_factory=RelationsCfg)
 
 def load_grounding_cfg(yml: dict) -> GroundingCfg:
     g = yml.get("grounding", {})
     d = g.get("dino", {})
     s = g.get("sam", {})
+    sp = s.get("policy", {})
+    tl = g.get("tiling", {})
+    rc = g.get("result_cache", {})
+    rl = g.get("relations", {})
+    ox = g.get("onnx", {})
+    backend = g.get("backend", "torch")
+    device = g.get("device", "cuda" if torch.cuda.is_available() else "cpu")
     return GroundingCfg(
-        device=g.get("device", "cuda" if torch.cuda.is_available() else "cpu"),
+        device="cpu" if backend == "onnx" else device,  # ONNX graphs run on the CPU provider
+        backend=backend,
+        onnx=OnnxCfg(dir=ox.get("dir", "weights/onnx"), threads=int(ox.get("threads", 0))),
         dino=DinoCfg(
             config=d.get("config", ""),                          # NEW
             ckpt=d.get("ckpt", ""),
@@ -38,10 +99,42 @@ def load_grounding_cfg(yml: dict) -> GroundingCfg:
             text_threshold=float(d.get("text_threshold", 0.25)),
             nms_iou=float(d.get("nms_iou", 0.5)),
             max_detections_per_target=int(d.get("max_detections_per_target", 3)),
+            single_pass=bool(d.get("single_pass", False)),
+            reuse_backbone=bool(d.get("reuse_backbone", True)),
         ),
         sam=SamCfg(
             ckpt=s.get("ckpt", ""),
             variant=s.get("variant", "vit_h"),
+            embedding_cache_dir=s.get("embedding_cache", {}).get("dir", ""),
+            embedding_cache_mb=int(s.get("embedding_cache", {}).get("max_mb", 2048)),
+            lazy=bool(s.get("lazy", False)),
+            backends=[
+                SamVariantCfg(variant=b["variant"], ckpt=b.get("ckpt", ""), latency_ms=float(b.get("latency_ms", 0.0)))
+                for b in s.get("backends", []) or []
+            ],
+            policy=SamPolicyCfg(
+                enabled=bool(sp.get("enabled", False)),
+                latency_budget_ms=float(sp.get("latency_budget_ms", 0.0)),
+                small_box_px=float(sp.get("small_box_px", 48.0)),
+                large_box_px=float(sp.get("large_box_px", 192.0)),
+                min_iou=float(sp.get("min_iou", 0.85)),
+            ),
+        ),
+        tiling=TilingCfg(
+            enabled=bool(tl.get("enabled", False)),
+            tile=int(tl.get("tile", 1024)),
+            overlap=int(tl.get("overlap", 256)),
+            min_side=int(tl.get("min_side", 2048)),
+        ),
+        result_cache=ResultCacheCfg(
+            enabled=bool(rc.get("enabled", False)),
+            mem_items=int(rc.get("mem_items", 256)),
+            dir=rc.get("dir", ""),
+            max_mb=int(rc.get("max_mb", 512)),
+        ),
+        relations=RelationsCfg(
+            prune=bool(rl.get("prune", True)),
+            min_score=float(rl.get("min_score", 0.5)),
         ),
     )
 
@@ -64,14 +157,168 @@ def try_load_groundingdino(cfg: DinoCfg, device: str):
     except Exception as e:
         return None, f"GroundingDINO import/load failed: {e}"
 
-def try_load_sam(cfg: SamCfg, device: str):
+def try_load_groundingdino_onnx(cfg: DinoCfg, ocfg: OnnxCfg):
     try:
+        from .onnx_backend import load_dino_onnx
+        return load_dino_onnx(cfg, ocfg), None
+    except Exception as e:
+        return None, f"GroundingDINO ONNX load failed: {e}"
+
+def sam_api(variant: str):
+    """(sam_model_registry, SamPredictor) for a variant; vit_t is MobileSAM's distilled encoder."""
+    if variant == "vit_t":
+        from mobile_sam import sam_model_registry, SamPredictor
+    else:
         from segment_anything import sam_model_registry, SamPredictor
+    return sam_model_registry, SamPredictor
+
+def try_load_sam(cfg: SamCfg, device: str):
+    try:
+        sam_model_registry, SamPredictor = sam_api(cfg.variant)
         if not os.path.isfile(cfg.ckpt):
             return None, None, "Missing SAM checkpoint"
         sam = sam_model_registry[cfg.variant](checkpoint=cfg.ckpt)
         sam.to(device)
+        sam.eval()
         predictor = SamPredictor(sam)
         return sam, predictor, None
     except Exception as e:
         return None, None, f"SAM import/load failed: {e}"
+
+def try_load_sam_onnx(cfg: SamCfg, ocfg: OnnxCfg):
+    try:
+        from .onnx_backend import load_sam_onnx
+        sam, predictor = load_sam_onnx(cfg, ocfg)
+        return sam, predictor, None
+    except Exception as e:
+        return None, None, f"SAM ONNX load failed: {e}"
+
+
+# ---------- process-wide model registry ----------
+
+@dataclass
+class _RegistryEntry:
+    models: Tuple[Any, ...]
+    load_s: float
+    hits: int = 0
+    created: float = field(default_factory=time.time)
+
+_REGISTRY: Dict[Tuple[str, ...], _RegistryEntry] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _registry_get(key: Tuple[str, ...], loader):
+    """
+    Returns (models, error, info) for *key*, loading through *loader* on the first call.
+    Failed loads are not cached so that a checkpoint dropped in later gets picked up.
+    """
+    with _REGISTRY_LOCK:
+        entry = _REGISTRY.get(key)
+        if entry is not None:
+            entry.hits += 1
+            return entry.models, None, {"cached": True, "load_s": entry.load_s, "hits": entry.hits}
+
+        t0 = time.perf_counter()
+        *models, err = loader()
+        load_s = time.perf_counter() - t0
+        if err is None:
+            _REGISTRY[key] = _RegistryEntry(models=tuple(models), load_s=load_s)
+        return tuple(models), err, {"cached": False, "load_s": load_s, "hits": 0}
+
+
+def get_groundingdino(cfg: DinoCfg, device: str, onnx: Optional[OnnxCfg] = None):
+    """
+    Cached variant of try_load_groundingdino: one eval-mode model per (config, ckpt, device).
+    With *onnx*, the onnxruntime stand-in instead. Returns (model, error, info).
+    """
+    key = ("dino", os.path.abspath(cfg.config) if cfg.config else "", os.path.abspath(cfg.ckpt), "", str(device))
+    if onnx is not None:
+        key = ("dino-onnx",) + key[1:4] + (os.path.abspath(onnx.dir),)
+        (model,), err, info = _registry_get(key, lambda: try_load_groundingdino_onnx(cfg, onnx))
+    else:
+        (model,), err, info = _registry_get(key, lambda: try_load_groundingdino(cfg, device))
+    return model, err, info
+
+
+def get_sam(cfg: SamCfg, device: str, onnx: Optional[OnnxCfg] = None):
+    """
+    Cached variant of try_load_sam: one eval-mode SAM + predictor per (ckpt, variant, device).
+    With *onnx*, image encoder and mask decoder run on onnxruntime.
+    Returns (sam, predictor, error, info).
+    """
+    key = ("sam", "", os.path.abspath(cfg.ckpt), cfg.variant, str(device))
+    if onnx is not None:
+        key = ("sam-onnx",) + key[1:4] + (os.path.abspath(onnx.dir),)
+        (sam, predictor), err, info = _registry_get(key, lambda: try_load_sam_onnx(cfg, onnx))
+    else:
+        (sam, predictor), err, info = _registry_get(key, lambda: try_load_sam(cfg, device))
+    return sam, predictor, err, info
+
+
+# ---------- several SAM sizes behind one interface ----------
+
+class SamBackend:
+    """
+    Hosts several SAM predictors (SamCfg.backends, smallest first); each is loaded on
+    first use through the registry. choose() applies SamCfg.policy to one request.
+    """
+
+    def __init__(self, cfg: SamCfg, device: str, onnx: Optional[OnnxCfg] = None):
+        self.cfg, self.device, self.onnx = cfg, device, onnx
+        self.ladder = list(cfg.backends)
+        self.info: Dict[str, Any] = {}
+
+    def predictor(self, variant: str):
+        """SamPredictor for *variant*, or None if it failed to load (error in self.info)."""
+        b = next(b for b in self.ladder if b.variant == variant)
+        _, predictor, err, info = get_sam(SamCfg(ckpt=b.ckpt, variant=b.variant), self.device, self.onnx)
+        self.info[variant] = info if err is None else {"error": err}
+        return predictor
+
+    def choose(self, boxes, image_size: Tuple[int, int], input_size: int = 1024) -> List[str]:
+        """
+        Variants to run, in order: the first one for every box, the rest as the escalation
+        ladder for low-IoU masks.
+
+        The smallest box decides the start (SAM sees the image at *input_size* on its long
+        side, so small objects need the larger encoders); the latency budget caps both the
+        start and how far escalation may go.
+        """
+        p = self.cfg.policy
+        ladder = self.ladder
+        if p.latency_budget_ms > 0:
+            ladder = [b for b in ladder if b.latency_ms <= p.latency_budget_ms] or ladder[:1]
+
+        H, W = image_size
+        scale = input_size / max(H, W)
+        sides = [min(x2 - x1, y2 - y1) * scale for x1, y1, x2, y2 in boxes]
+        side = min(sides) if sides else p.large_box_px
+        if side >= p.large_box_px:
+            start = 0
+        elif side < p.small_box_px:
+            start = len(ladder) - 1
+        else:
+            start = (len(ladder) - 1) // 2
+
+        order, spent = [ladder[start]], ladder[start].latency_ms
+        for b in ladder[start + 1:]:
+            if p.latency_budget_ms > 0 and spent + b.latency_ms > p.latency_budget_ms:
+                break
+            order.append(b)
+            spent += b.latency_ms
+        return [b.variant for b in order]
+
+
+def registry_stats() -> Dict[str, Any]:
+    """Snapshot of what is resident: load time and cache hits per model key."""
+    with _REGISTRY_LOCK:
+        return {
+            "|".join(k): {"load_s": round(e.load_s, 3), "hits": e.hits}
+            for k, e in _REGISTRY.items()
+        }
+
+
+def clear_registry() -> None:
+    """Drops every cached model (frees memory; the next call reloads)."""
+    with _REGISTRY_LOCK:
+        _REGISTRY.clear()
@@ -0,0 +1,85 @@
+# src/grounding/nms.py
+from __future__ import annotations
+from typing import List
+import numpy as np
+
+# NumPy NMS; torch / torchvision are only imported for the large-N backend
+
+
+def _to_np(x) -> np.ndarray:
+    if hasattr(x, "detach"):  # torch.Tensor
+        return x.detach().cpu().numpy()
+    return np.asarray(x)
+
+
+# Above this many boxes torchvision's C++/CUDA kernel beats the NumPy IoU matrix
+NMS_TORCH_MIN_BOXES = 512
+
+
+def nms_xyxy(boxes: np.ndarray, scores: np.ndarray, iou_thresh: float) -> List[int]:
+    boxes = _to_np(boxes)
+    return batched_nms_xyxy(boxes, scores, np.zeros(len(boxes), dtype=np.int64), iou_thresh)
+
+
+def batched_nms_xyxy(boxes: np.ndarray, scores: np.ndarray, idxs: np.ndarray, iou_thresh: float,
+                     backend: str = "auto") -> List[int]:
+    """
+    Class-aware NMS: boxes only suppress boxes with the same idxs value (e.g. target index).
+    Returns kept indices sorted by decreasing score.
+
+    backend: "numpy" (IoU matrix, best for the handful of boxes per plan), "torch"
+    (torchvision.ops.batched_nms) or "auto" (picked by box count).
+    """
+    boxes = np.asarray(_to_np(boxes), dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(_to_np(scores), dtype=np.float32).reshape(-1)
+    idxs = np.asarray(_to_np(idxs), dtype=np.int64).reshape(-1)
+    if len(boxes) == 0:
+        return []
+    if backend == "auto":
+        backend = "torch" if len(boxes) >= NMS_TORCH_MIN_BOXES else "numpy"
+    if backend == "torch":
+        try:
+            import torch
+            import torchvision
+        except ImportError:
+            backend = "numpy"
+        else:
+            keep = torchvision.ops.batched_nms(
+                torch.as_tensor(boxes), torch.as_tensor(scores), torch.as_tensor(idxs), float(iou_thresh)
+            )
+            return keep.cpu().numpy().tolist()
+    return _nms_numpy(_offset_by_class(boxes, idxs), scores, iou_thresh)
+
+
+def _offset_by_class(boxes: np.ndarray, idxs: np.ndarray) -> np.ndarray:
+    # Shift each class to its own disjoint region so one NMS never mixes classes
+    boxes = boxes.astype(np.float64)
+    if len(boxes) == 0 or idxs.max() == idxs.min():
+        return boxes
+    span = float(boxes.max() - min(boxes.min(), 0.0)) + 1.0
+    return boxes + (idxs * span)[:, None]
+
+
+def _iou_matrix(boxes: np.ndarray) -> np.ndarray:
+    """Pairwise IoU [N, N] (same definition as torchvision.ops.box_iou)."""
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    lt = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    rb = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    wh = np.clip(rb - lt, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+    union = area[:, None] + area[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _nms_numpy(boxes: np.ndarray, scores: np.ndarray, iou_thresh: float) -> List[int]:
+    order = np.argsort(-scores, kind="stable")
+    over = _iou_matrix(boxes[order]) > iou_thresh
+    n = len(order)
+    suppressed = np.zeros(n, dtype=bool)
+    keep = []
+    for i in range(n):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed[i + 1:] |= over[i, i + 1:]
+    return order[keep].tolist()
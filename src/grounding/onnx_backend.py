@@ -0,0 +1,261 @@
+# src/grounding/onnx_backend.py
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# ONNX graphs run on CPU; onnx / onnxruntime are optional and imported on use.
+OPSET = 17
+
+
+# Graph files are named after their checkpoint, so a new ckpt needs a new export
+
+def dino_onnx_path(dcfg, ocfg) -> Path:
+    return Path(ocfg.dir) / f"{Path(dcfg.ckpt).stem or 'groundingdino'}.onnx"
+
+
+def sam_onnx_paths(scfg, ocfg) -> Tuple[Path, Path]:
+    """(image encoder, mask decoder) graph files."""
+    stem = Path(scfg.ckpt).stem or scfg.variant
+    return Path(ocfg.dir) / f"{stem}_encoder.onnx", Path(ocfg.dir) / f"{stem}_decoder.onnx"
+
+
+def make_session(path: Path, threads: int = 0):
+    """onnxruntime CPU session with every graph optimisation enabled."""
+    import onnxruntime as ort
+    if not Path(path).is_file():
+        raise FileNotFoundError(f"{path} (run scripts/export_onnx.py first)")
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads > 0:
+        so.intra_op_num_threads = threads
+    return ort.InferenceSession(str(path), so, providers=["CPUExecutionProvider"])
+
+
+# ---------- GroundingDINO ----------
+
+_DINO_INPUTS = ["image", "input_ids", "token_type_ids", "attention_mask", "position_ids",
+                "text_self_attention_masks"]
+
+
+def encode_captions(tokenizer, special_tokens: List[int], captions: List[str], max_text_len: int = 256):
+    """The text side of GroundingDINO.forward (tokens + sub-sentence masks) as graph inputs."""
+    from groundingdino.models.GroundingDINO.bertwarper import generate_masks_with_special_tokens_and_transfer_map
+    tokenized = tokenizer(captions, padding="longest", return_tensors="pt")
+    masks, position_ids, _ = generate_masks_with_special_tokens_and_transfer_map(tokenized, special_tokens, tokenizer)
+    n = max_text_len
+    return {
+        "input_ids": tokenized["input_ids"][:, :n],
+        "token_type_ids": tokenized["token_type_ids"][:, :n],
+        "attention_mask": tokenized["attention_mask"][:, :n],
+        "position_ids": position_ids[:, :n],
+        "text_self_attention_masks": masks[:, :n, :n],
+    }
+
+
+class _DinoExport(torch.nn.Module):
+    """
+    GroundingDINO.forward with the tokenizer moved out: takes the image and the
+    encoded caption tensors, returns (pred_logits, pred_boxes). Single unpadded image.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image, input_ids, token_type_ids, attention_mask, position_ids, text_self_attention_masks):
+        from groundingdino.util.misc import NestedTensor, inverse_sigmoid
+        m = self.model
+        if m.sub_sentence_present:
+            bert_out = m.bert(input_ids=input_ids, token_type_ids=token_type_ids,
+                              attention_mask=text_self_attention_masks, position_ids=position_ids)
+        else:
+            bert_out = m.bert(input_ids=input_ids, token_type_ids=token_type_ids, attention_mask=attention_mask)
+        text_dict = {
+            "encoded_text": m.feat_map(bert_out["last_hidden_state"]),
+            "text_token_mask": attention_mask.bool(),
+            "position_ids": position_ids,
+            "text_self_attention_masks": text_self_attention_masks,
+        }
+
+        pad = torch.zeros_like(image[:, 0], dtype=torch.bool)
+        features, poss = m.backbone(NestedTensor(image, pad))
+        poss = list(poss)
+        srcs, masks = [], []
+        for lvl, feat in enumerate(features):
+            src, mask = feat.decompose()
+            srcs.append(m.input_proj[lvl](src))
+            masks.append(mask)
+        for lvl in range(len(srcs), m.num_feature_levels):
+            src = m.input_proj[lvl](features[-1].tensors if lvl == len(features) else srcs[-1])
+            mask = F.interpolate(pad[None].float(), size=src.shape[-2:]).to(torch.bool)[0]
+            srcs.append(src)
+            masks.append(mask)
+            poss.append(m.backbone[1](NestedTensor(src, mask)).to(src.dtype))
+
+        hs, reference, _, _, _ = m.transformer(srcs, masks, None, poss, None, None, text_dict)
+        last = len(hs) - 1
+        boxes = (m.bbox_embed[last](hs[last]) + inverse_sigmoid(reference[last])).sigmoid()
+        logits = m.class_embed[last](hs[last], text_dict)
+        return logits, boxes
+
+
+def export_dino(model, tokenizer, path: Path, max_text_len: int = 256) -> Path:
+    """Writes the GroundingDINO graph (model must be the eager CPU model, in eval mode)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    special = tokenizer.convert_tokens_to_ids(["[CLS]", "[SEP]", ".", "?"])
+    text = encode_captions(tokenizer, special, ["a cat . a remote control ."], max_text_len)
+    image = torch.randn(1, 3, 800, 1200)
+    args = (image,) + tuple(text[k] for k in _DINO_INPUTS[1:])
+    tokens = {1: "tokens"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _DinoExport(model.cpu().eval()), args, str(path),
+            input_names=_DINO_INPUTS, output_names=["pred_logits", "pred_boxes"],
+            dynamic_axes={
+                "image": {2: "height", 3: "width"},
+                "input_ids": tokens, "token_type_ids": tokens, "attention_mask": tokens,
+                "position_ids": tokens, "text_self_attention_masks": {1: "tokens", 2: "tokens"},
+            },
+            opset_version=OPSET,
+        )
+    return path
+
+
+class OnnxGroundingDINO:
+    """
+    Stands in for the eager model wherever the pipeline calls it (groundingdino's
+    predict(), predict_multi): model(images, captions=[...]) -> pred_logits / pred_boxes,
+    plus .tokenizer, .to() and .eval().
+    """
+
+    def __init__(self, session, tokenizer, max_text_len: int = 256):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.max_text_len = max_text_len
+        self.special_tokens = tokenizer.convert_tokens_to_ids(["[CLS]", "[SEP]", ".", "?"])
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+    def __call__(self, samples: torch.Tensor, captions: List[str]) -> Dict[str, torch.Tensor]:
+        text = encode_captions(self.tokenizer, self.special_tokens, captions, self.max_text_len)
+        logits, boxes = [], []
+        for i in range(samples.shape[0]):  # graph is exported for one image
+            feeds = {"image": samples[i:i + 1].detach().cpu().float().numpy()}
+            feeds.update({k: v[i:i + 1].numpy() for k, v in text.items()})
+            lg, bx = self.session.run(["pred_logits", "pred_boxes"], feeds)
+            logits.append(lg)
+            boxes.append(bx)
+        return {"pred_logits": torch.from_numpy(np.concatenate(logits)),
+                "pred_boxes": torch.from_numpy(np.concatenate(boxes))}
+
+
+def load_dino_onnx(dcfg, ocfg) -> OnnxGroundingDINO:
+    from groundingdino.util.slconfig import SLConfig
+    from groundingdino.util import get_tokenlizer
+    args = SLConfig.fromfile(dcfg.config)
+    tokenizer = get_tokenlizer.get_tokenlizer(args.text_encoder_type)
+    session = make_session(dino_onnx_path(dcfg, ocfg), ocfg.threads)
+    return OnnxGroundingDINO(session, tokenizer, int(getattr(args, "max_text_len", 256)))
+
+
+# ---------- SAM ----------
+
+class _DecoderExport(torch.nn.Module):
+    """MaskDecoder for one prompt (single-mask output); the runtime loops over boxes."""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+
+    def forward(self, image_embeddings, image_pe, sparse_prompt_embeddings, dense_prompt_embeddings):
+        return self.decoder(
+            image_embeddings=image_embeddings, image_pe=image_pe,
+            sparse_prompt_embeddings=sparse_prompt_embeddings, dense_prompt_embeddings=dense_prompt_embeddings,
+            multimask_output=False,
+        )
+
+
+def export_sam(sam, encoder_path: Path, decoder_path: Path) -> None:
+    """Writes the SAM image encoder and mask decoder graphs (eager CPU model, eval mode)."""
+    sam = sam.cpu().eval()
+    size = sam.image_encoder.img_size
+    Path(encoder_path).parent.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            sam.image_encoder, (torch.randn(1, 3, size, size),), str(encoder_path),
+            input_names=["image"], output_names=["image_embeddings"], opset_version=OPSET,
+        )
+        emb = sam.prompt_encoder.embed_dim
+        grid = sam.prompt_encoder.image_embedding_size
+        sparse, dense = sam.prompt_encoder(points=None, boxes=torch.tensor([[10.0, 20.0, 300.0, 400.0]]), masks=None)
+        torch.onnx.export(
+            _DecoderExport(sam.mask_decoder),
+            (torch.randn(1, emb, *grid), sam.prompt_encoder.get_dense_pe(), sparse, dense),
+            str(decoder_path),
+            input_names=["image_embeddings", "image_pe", "sparse_prompt_embeddings", "dense_prompt_embeddings"],
+            output_names=["low_res_masks", "iou_predictions"],
+            dynamic_axes={"sparse_prompt_embeddings": {1: "prompt_tokens"}},
+            opset_version=OPSET,
+        )
+
+
+class OrtImageEncoder(torch.nn.Module):
+    """Drop-in for sam.image_encoder (SamPredictor checks .img_size)."""
+
+    def __init__(self, session, img_size: int):
+        super().__init__()
+        self.session = session
+        self.img_size = img_size
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        (out,) = self.session.run(["image_embeddings"], {"image": x.detach().cpu().float().numpy()})
+        return torch.from_numpy(out).to(x.device)
+
+
+class OrtMaskDecoder(torch.nn.Module):
+    """Drop-in for sam.mask_decoder (single-mask output, one ORT run per prompt)."""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def forward(self, image_embeddings, image_pe, sparse_prompt_embeddings, dense_prompt_embeddings,
+                multimask_output: bool):
+        if multimask_output:
+            raise ValueError("ONNX SAM decoder is exported with multimask_output=False")
+        emb = image_embeddings.detach().cpu().float().numpy()
+        pe = image_pe.detach().cpu().float().numpy()
+        masks, ious = [], []
+        for i in range(sparse_prompt_embeddings.shape[0]):
+            m, s = self.session.run(["low_res_masks", "iou_predictions"], {
+                "image_embeddings": emb[min(i, len(emb) - 1)][None],
+                "image_pe": pe,
+                "sparse_prompt_embeddings": sparse_prompt_embeddings[i:i + 1].detach().cpu().float().numpy(),
+                "dense_prompt_embeddings": dense_prompt_embeddings[i:i + 1].detach().cpu().float().numpy(),
+            })
+            masks.append(m)
+            ious.append(s)
+        device = image_embeddings.device
+        return torch.from_numpy(np.concatenate(masks)).to(device), torch.from_numpy(np.concatenate(ious)).to(device)
+
+
+def load_sam_onnx(scfg, ocfg):
+    """Eager SAM (prompt encoder, pre/post-processing) with the encoder and decoder on onnxruntime."""
+    from .models import sam_api
+    sam_model_registry, SamPredictor = sam_api(scfg.variant)
+    enc_path, dec_path = sam_onnx_paths(scfg, ocfg)
+    encoder = make_session(enc_path, ocfg.threads)
+    decoder = make_session(dec_path, ocfg.threads)
+    sam = sam_model_registry[scfg.variant](checkpoint=scfg.ckpt)
+    sam.eval()
+    sam.image_encoder = OrtImageEncoder(encoder, sam.image_encoder.img_size)
+    sam.mask_decoder = OrtMaskDecoder(decoder)
+    return sam, SamPredictor(sam)
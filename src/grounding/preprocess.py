@@ -0,0 +1,47 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional, Union
+import numpy as np
+import torch
+from PIL import Image
+
+import groundingdino.datasets.transforms as T
+
+from src.utils.image_context import ImageContext
+
+# Same transform as groundingdino.util.inference.load_image
+_DINO_TRANSFORM = T.Compose([
+    T.RandomResize([800], max_size=1333),
+    T.ToTensor(),
+    T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+])
+
+
+@dataclass
+class GroundingInputs:
+    rgb: Image.Image          # RGB PIL image (converted once)
+    rgb_np: np.ndarray        # [H, W, 3] uint8, shared with SAM
+    dino: Optional[torch.Tensor]  # [3, h, w] normalized DINO input
+    ctx: Optional[ImageContext] = None  # request-wide image context the above come from
+
+
+def dino_tensor(rgb: Image.Image) -> torch.Tensor:
+    """DINO input tensor straight from an in-memory RGB image (no file round trip)."""
+    tensor, _ = _DINO_TRANSFORM(rgb, None)
+    return tensor
+
+
+def context_dino_tensor(ctx: ImageContext) -> torch.Tensor:
+    """dino_tensor memoised on the image context."""
+    return ctx.derive("dino", lambda c: dino_tensor(c.rgb))
+
+
+def prepare_inputs(img: Union[Image.Image, np.ndarray, ImageContext], with_dino: bool = True) -> GroundingInputs:
+    """
+    Converts *img* to RGB once and derives both the DINO tensor and the SAM array from it
+    (reusing whatever an ImageContext already holds).
+    with_dino=False skips the full-image DINO tensor (tiled mode builds one per tile).
+    """
+    ctx = ImageContext.of(img)
+    return GroundingInputs(rgb=ctx.rgb, rgb_np=ctx.rgb_np, dino=context_dino_tensor(ctx) if with_dino else None,
+                           ctx=ctx)
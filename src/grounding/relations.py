@@ -0,0 +1,96 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Sequence
+import numpy as np
+
+RELATIONS = ("left_of", "right_of", "next_to", "behind", "in_front_of", "above", "below")
+
+
+def _geom(boxes: np.ndarray):
+    b = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    w = np.maximum(b[:, 2] - b[:, 0], 1.0)
+    h = np.maximum(b[:, 3] - b[:, 1], 1.0)
+    cx = (b[:, 0] + b[:, 2]) / 2.0
+    cy = (b[:, 1] + b[:, 3]) / 2.0
+    return b, w, h, cx, cy
+
+
+def relation_scores(rel: str, subj_boxes: np.ndarray, obj_boxes: np.ndarray) -> np.ndarray:
+    """
+    Scores in [0, 1] for "subject <rel> object" over every (subject, object) box pair,
+    shape [N_subj, N_obj]. 0.5 is the neutral point: above it the relation holds.
+
+    Directional relations compare centres (left/right, above/below) or bottom edges
+    (behind / in_front_of: lower in the frame = closer to the camera), normalised by
+    the pair's combined extent. next_to decays with the gap between the boxes
+    relative to their size.
+    """
+    sb, sw, sh, scx, scy = _geom(subj_boxes)
+    ob, ow, oh, ocx, ocy = _geom(obj_boxes)
+    wsum = sw[:, None] + ow[None, :]
+    hsum = sh[:, None] + oh[None, :]
+
+    if rel == "left_of":
+        s = 0.5 + (ocx[None, :] - scx[:, None]) / wsum
+    elif rel == "right_of":
+        s = 0.5 + (scx[:, None] - ocx[None, :]) / wsum
+    elif rel == "above":
+        s = 0.5 + (ocy[None, :] - scy[:, None]) / hsum
+    elif rel == "below":
+        s = 0.5 + (scy[:, None] - ocy[None, :]) / hsum
+    elif rel == "in_front_of":
+        s = 0.5 + (sb[:, None, 3] - ob[None, :, 3]) / hsum
+    elif rel == "behind":
+        s = 0.5 + (ob[None, :, 3] - sb[:, None, 3]) / hsum
+    elif rel == "next_to":
+        gx = np.maximum(0.0, np.maximum(sb[:, None, 0], ob[None, :, 0]) - np.minimum(sb[:, None, 2], ob[None, :, 2]))
+        gy = np.maximum(0.0, np.maximum(sb[:, None, 1], ob[None, :, 1]) - np.minimum(sb[:, None, 3], ob[None, :, 3]))
+        scale = (np.maximum(sw, sh)[:, None] + np.maximum(ow, oh)[None, :]) / 2.0
+        s = 1.0 - np.hypot(gx, gy) / (2.0 * scale)
+    else:
+        raise ValueError(f"Unknown relation: {rel}")
+    return np.clip(s, 0.0, 1.0)
+
+
+def prune_by_relations(relations: Sequence, targets: List[Dict[str, Any]], prunable: Sequence[int],
+                       min_score: float = 0.5):
+    """
+    Drops boxes of the *prunable* targets that satisfy none of the plan's relations.
+
+    For each relation whose subject and object both have boxes, a subject box is kept
+    if some object box scores >= min_score with it (and vice versa). A relation that
+    would leave either side empty is not applied. Returns (keep indices per target,
+    decisions for the grounding meta).
+    """
+    by_name: Dict[str, int] = {}
+    for i, t in enumerate(targets):
+        by_name.setdefault(t["name"], i)
+    prunable = set(prunable)
+    keep = [np.arange(len(t["boxes"])) for t in targets]
+    decisions = []
+
+    for r in relations:
+        d = {"subj": r.subj, "rel": r.rel, "obj": r.obj}
+        si, oi = by_name.get(r.subj), by_name.get(r.obj)
+        if si is None or oi is None or si == oi:
+            decisions.append({**d, "applied": False, "reason": "target not grounded"})
+            continue
+        if r.rel not in RELATIONS:
+            decisions.append({**d, "applied": False, "reason": "unsupported relation"})
+            continue
+        ks, ko = keep[si], keep[oi]
+        if len(ks) == 0 or len(ko) == 0:
+            decisions.append({**d, "applied": False, "reason": "no boxes on one side"})
+            continue
+
+        sb = np.asarray(targets[si]["boxes"], dtype=np.float32)[ks]
+        ob = np.asarray(targets[oi]["boxes"], dtype=np.float32)[ko]
+        ok = relation_scores(r.rel, sb, ob) >= min_score
+        new_s = ks[ok.any(axis=1)] if si in prunable else ks
+        new_o = ko[ok.any(axis=0)] if oi in prunable else ko
+        if len(new_s) == 0 or len(new_o) == 0:
+            decisions.append({**d, "applied": False, "reason": "no pair satisfies it"})
+            continue
+        keep[si], keep[oi] = new_s, new_o
+        decisions.append({**d, "applied": True,
+                          "dropped": {r.subj: int(len(ks) - len(new_s)), r.obj: int(len(ko) - len(new_o))}})
+    return keep, decisions
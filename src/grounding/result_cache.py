@@ -0,0 +1,166 @@
+from __future__ import annotations
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .masks import MaskList
+
+
+class GroundingResultCache:
+    """
+    Two-level cache of per-target grounding results (boxes, scores, RLE masks).
+
+    Level 1 is an in-process LRU of *mem_items* entries; level 2 is one JSON file per
+    key under *cache_dir*, evicted least-recently-used (file mtime) above *max_bytes*.
+    A disk hit is promoted to memory. Entries go in and come out as copies, so a
+    caller editing its targets never changes what later requests get.
+    """
+
+    def __init__(self, mem_items: int = 256, cache_dir: str = "", max_bytes: int = 512 << 20):
+        self.mem_items = int(mem_items)
+        self.dir = Path(cache_dir) if cache_dir else None
+        if self.dir is not None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key(image_hash: str, prompt: str, gcfg, tiled: bool = False, context=()) -> str:
+        """*context*: anything else the target's result depends on (e.g. relation partners)."""
+        d, s = gcfg.dino, gcfg.sam
+        ident = {
+            "image": image_hash,
+            "prompt": " ".join(prompt.lower().split()),
+            "box_threshold": d.box_threshold,
+            "text_threshold": d.text_threshold,
+            "nms_iou": d.nms_iou,
+            "max_det": d.max_detections_per_target,
+            "single_pass": d.single_pass,
+            "tiled": [tiled, gcfg.tiling.tile, gcfg.tiling.overlap] if tiled else False,
+            "dino": [os.path.basename(d.ckpt), _mtime(d.ckpt)],
+            "sam": [s.variant, os.path.basename(s.ckpt), _mtime(s.ckpt)],
+            "sam_policy": [[b.variant, os.path.basename(b.ckpt), _mtime(b.ckpt)] for b in s.backends]
+                          + [s.policy.latency_budget_ms, s.policy.small_box_px, s.policy.large_box_px, s.policy.min_iou]
+                          if s.policy.enabled and s.backends else None,
+            "context": list(context),
+            "backend": getattr(gcfg, "backend", "torch"),
+        }
+        return hashlib.sha1(json.dumps(ident, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return _copy(entry)
+        entry = self._disk_get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits["disk"] += 1
+        self._mem_put(key, entry)
+        return _copy(entry)
+
+    def put(self, key: str, boxes, scores, masks: Optional[MaskList]) -> None:
+        entry = _copy({"boxes": boxes, "scores": scores, "masks": masks})
+        self._mem_put(key, entry)
+        if self.dir is not None:
+            self._disk_put(key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": dict(self.hits), "misses": self.misses, "memory_items": len(self._mem)}
+
+    # --- memory level ---
+
+    def _mem_put(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._mem[key] = entry
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.mem_items:
+                self._mem.popitem(last=False)
+
+    # --- disk level ---
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.dir is None:
+            return None
+        p = self.dir / f"{key}.json"
+        try:
+            d = json.loads(p.read_text())
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+        masks = MaskList.from_json(d["masks"]) if d.get("masks") else None
+        return {"boxes": d["boxes"], "scores": d["scores"], "masks": masks}
+
+    def _disk_put(self, key: str, entry: Dict[str, Any]) -> None:
+        p = self.dir / f"{key}.json"
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        masks = entry["masks"]
+        tmp.write_text(json.dumps({
+            "boxes": entry["boxes"],
+            "scores": entry["scores"],
+            "masks": masks.to_json() if masks is not None else None,
+        }))
+        os.replace(tmp, p)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for p in self.dir.glob("*.json"):
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            total = sum(size for _, size, _ in entries)
+            for _, size, p in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    p.unlink()
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+def _copy(entry: Dict[str, Any]) -> Dict[str, Any]:
+    # RLEMask objects are never modified in place: copying the containers is enough
+    m = entry["masks"]
+    return {"boxes": [list(b) for b in entry["boxes"]], "scores": list(entry["scores"]),
+            "masks": MaskList(list(m.rles)) if m is not None else None}
+
+
+def _mtime(path: str) -> float:
+    # checkpoint identity without hashing gigabytes: name + modification time
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+_CACHES: Dict[tuple, GroundingResultCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_result_cache(cfg) -> Optional[GroundingResultCache]:
+    """Process-wide cache for a ResultCacheCfg (None when disabled)."""
+    if not cfg.enabled:
+        return None
+    key = (os.path.abspath(cfg.dir) if cfg.dir else "", cfg.mem_items, cfg.max_mb)
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = GroundingResultCache(cfg.mem_items, cfg.dir, int(cfg.max_mb) << 20)
+        return _CACHES[key]
@@ -0,0 +1,62 @@
+from __future__ import annotations
+from typing import Iterator, List, Tuple
+import numpy as np
+
+Window = Tuple[int, int, int, int]  # x0, y0, x1, y1 (exclusive end)
+
+
+def _starts(length: int, tile: int, stride: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] + tile < length:
+        starts.append(length - tile)  # last tile flush with the border
+    return starts
+
+
+def iter_tiles(W: int, H: int, tile: int, overlap: int) -> Iterator[Window]:
+    """Overlapping tile windows covering a W x H image, row by row."""
+    stride = max(tile - overlap, 1)
+    for y0 in _starts(H, tile, stride):
+        for x0 in _starts(W, tile, stride):
+            yield (x0, y0, min(x0 + tile, W), min(y0 + tile, H))
+
+
+def to_image_coords(boxes: np.ndarray, win: Window) -> np.ndarray:
+    """[N, 4] xyxy boxes in tile pixels -> full-image pixels."""
+    x0, y0 = win[0], win[1]
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4) + np.array([x0, y0, x0, y0], dtype=np.float32)
+
+
+def contains(win: Window, box) -> bool:
+    x0, y0, x1, y1 = win
+    return box[0] >= x0 and box[1] >= y0 and box[2] < x1 and box[3] < y1
+
+
+def window_around(box, W: int, H: int, tile: int) -> Window:
+    """A tile-sized window (larger if the box is) centred on *box*, clamped to the image."""
+    bw, bh = int(box[2] - box[0]) + 1, int(box[3] - box[1]) + 1
+    ww, wh = min(max(tile, bw), W), min(max(tile, bh), H)
+    cx, cy = (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+    x0 = int(min(max(cx - ww / 2.0, 0), W - ww))
+    y0 = int(min(max(cy - wh / 2.0, 0), H - wh))
+    return (x0, y0, x0 + ww, y0 + wh)
+
+
+def assign_windows(boxes, W: int, H: int, tile: int, overlap: int) -> Tuple[List[Window], List[int]]:
+    """
+    Groups boxes into as few SAM windows as possible: a window already in use, else a
+    detection tile that fully contains the box, else a window centred on it.
+    Returns (windows, window index per box).
+    """
+    grid = list(iter_tiles(W, H, tile, overlap))
+    windows: List[Window] = []
+    owner: List[int] = []
+    for b in boxes:
+        idx = next((i for i, w in enumerate(windows) if contains(w, b)), None)
+        if idx is None:
+            win = next((w for w in grid if contains(w, b)), None) or window_around(b, W, H, tile)
+            windows.append(win)
+            idx = len(windows) - 1
+        owner.append(idx)
+    return windows, owner
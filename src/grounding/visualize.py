@@ -1,11 +1,14 @@
-# src/grounding/visualize.py
 from __future__ import annotations
 from typing import List, Tuple
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 
+from src.utils.image_context import ImageContext
+
+
 def draw_boxes(img: Image.Image, boxes: List[Tuple[int,int,int,int]], labels=None, color=(0,255,0), alpha=70) -> Image.Image:
-    out = img.convert("RGBA")
+    # Fills and compositing already run in C (ImageDraw / alpha_composite) over whole rectangles.
+    out = ImageContext.of(img).rgba()
     overlay = Image.new("RGBA", out.size, (0,0,0,0))
     d = ImageDraw.Draw(overlay)
     for i, b in enumerate(boxes):
@@ -16,7 +19,7 @@ def draw_boxes(img: Image.Image, boxes: List[Tuple[int,int,int,int]], labels=Non
         # Vérifier que la boîte a une taille valide
         if x_max <= x_min or y_max <= y_min:
             continue  # Ignorer les boîtes invalides
-        d.rectangle([x_min, y_min, x_max, y_max], outline=color+(255,), width=3)
+        # The fill covers the whole rectangle, so a separate outline would never show
         d.rectangle([x_min, y_min, x_max, y_max], fill=color+(alpha,))
         if labels is not None:
             try:
@@ -26,18 +29,37 @@ def draw_boxes(img: Image.Image, boxes: List[Tuple[int,int,int,int]], labels=Non
                 pass
     return Image.alpha_composite(out, overlay).convert("RGB")
 
+
+def _blend_lut(tint, alpha: int) -> np.ndarray:
+    """[3, 256] table: overlay channel value -> blend(value, tint) (same float arithmetic)."""
+    a = alpha / 255.0
+    v = np.arange(256, dtype=np.float64)
+    return np.floor(v[None, :] * (1 - a) + np.asarray(tint, dtype=np.float64)[:, None] * a).astype(np.uint8)
+
+
 def draw_masks(img: Image.Image, masks: np.ndarray, alpha=70) -> Image.Image:
-    out = img.convert("RGBA")
-    overlay = Image.new("RGBA", out.size, (0,0,0,0))
-    d = ImageDraw.Draw(overlay)
-    h, w = img.size[1], img.size[0]
-    # merge masks with color tint per index
+    base = ImageContext.of(img).rgb_np
+    h, w = base.shape[:2]
+    # Same result as blend() pixel by pixel: every covered pixel becomes opaque and
+    # overlapping masks blend in index order. Each mask is one table lookup over its bbox.
+    overlay = np.zeros((h, w, 3), dtype=np.uint8)
+    covered = np.zeros((h, w), dtype=bool)
     for i, m in enumerate(masks):
-        tint = (int(60+170*(i%3==0)), int(60+170*(i%3==1)), int(60+170*(i%3==2)), alpha)
-        ys, xs = np.where(m)
-        for y, x in zip(ys, xs):
-            overlay.putpixel((x, y), blend(overlay.getpixel((x,y)), tint))
-    return Image.alpha_composite(out, overlay).convert("RGB")
+        m = np.asarray(m, dtype=bool)
+        rows, cols = np.flatnonzero(m.any(axis=1)), np.flatnonzero(m.any(axis=0))
+        if rows.size == 0:
+            continue
+        win = (slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1))
+        tint = (60+170*(i%3==0), 60+170*(i%3==1), 60+170*(i%3==2))
+        lut = _blend_lut(tint, alpha)
+        mw, ow = m[win], overlay[win]
+        for c in range(3):
+            ow[..., c] = np.where(mw, lut[c][ow[..., c]], ow[..., c])
+        covered[win] |= mw
+    out = base.copy()
+    np.copyto(out, overlay, where=covered[..., None])
+    return Image.fromarray(out)
+
 
 def blend(bg, fg):
     # naive alpha blend on a pixel (bg RGBA, fg RGBA)
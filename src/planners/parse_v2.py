@@ -35,7 +35,7 @@ STRICT RULES:
 
 IMPORTANT CONSTRAINTS:
 - "type" in ops MUST be one of: "add", "remove", "recolor", "replace" (NOT "move", "write", or anything else)
-- "rel" in relations MUST be one of: "left_of", "right_of", "next_to", "behind", "in_front_of"
+- "rel" in relations MUST be one of: "left_of", "right_of", "next_to", "behind", "in_front_of", "above", "below"
 - If the instruction involves writing text, use type="add" with params containing the text
 - Relations are optional - if no spatial relation is specified, use an empty relations array []
 - For color changes, use type="recolor" with params={{"color": "colorname"}}
@@ -71,7 +71,7 @@ def _sanitize_plan_dict(plan_dict: Dict[str, Any]) -> Dict[str, Any]:
     """
     # Valid values according to schema
     VALID_OPS = {"add", "remove", "recolor", "replace", "unknown"}
-    VALID_RELS = {"left_of", "right_of", "next_to", "behind", "in_front_of"}
+    VALID_RELS = {"left_of", "right_of", "next_to", "behind", "in_front_of", "above", "below"}
     
     # Clean operations
     if "ops" in plan_dict:
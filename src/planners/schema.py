@@ -8,7 +8,7 @@ class Target(BaseModel):
 
 class Relation(BaseModel):
     subj: str
-    rel: Literal["left_of", "right_of", "next_to", "behind", "in_front_of"]
+    rel: Literal["left_of", "right_of", "next_to", "behind", "in_front_of", "above", "below"]
     obj: str
 
 class Operation(BaseModel):
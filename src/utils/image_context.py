@@ -0,0 +1,108 @@
+# src/utils/image_context.py
+from __future__ import annotations
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
+import numpy as np
+from PIL import Image
+
+
+class ImageContext:
+    """
+    One decoded input image shared by every stage of a request (grounding, debug
+    visualisation, editors).
+
+    The RGB pixels are decoded once; every other form a stage needs (array view,
+    editor inputs, model tensors) is built on first use and memoised under a key,
+    so a conversion or resize is paid once per request. Array forms are read-only
+    views over the same buffer wherever NumPy allows it.
+    """
+
+    def __init__(self, img: Union[Image.Image, np.ndarray]):
+        self._lock = threading.RLock()
+        self._cache: Dict[Hashable, Any] = {}
+        self._rgb: Image.Image | None = None
+        self._np: np.ndarray | None = None
+        if isinstance(img, np.ndarray):
+            arr = np.asarray(img)
+            if arr.dtype == np.uint8 and arr.ndim == 3 and arr.shape[2] == 3:
+                self._np = _readonly(arr)  # used as-is: no copy
+            else:
+                self._rgb = Image.fromarray(arr).convert("RGB")
+        elif isinstance(img, Image.Image):
+            self._rgb = img if img.mode == "RGB" else img.convert("RGB")
+        else:
+            raise TypeError(f"Expected PIL.Image or np.ndarray, got {type(img)}")
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "ImageContext":
+        with Image.open(path) as im:
+            return cls(im.convert("RGB"))
+
+    @classmethod
+    def of(cls, img) -> "ImageContext":
+        """*img* itself if it already is a context, else a new one around it."""
+        return img if isinstance(img, ImageContext) else cls(img)
+
+    # --- base forms ---
+
+    @property
+    def rgb(self) -> Image.Image:
+        """RGB PIL image."""
+        if self._rgb is None:
+            with self._lock:
+                if self._rgb is None:
+                    self._rgb = Image.fromarray(self._np)
+        return self._rgb
+
+    @property
+    def rgb_np(self) -> np.ndarray:
+        """[H, W, 3] uint8, read-only."""
+        if self._np is None:
+            with self._lock:
+                if self._np is None:
+                    self._np = _readonly(np.asarray(self._rgb))
+        return self._np
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """(W, H), as PIL."""
+        if self._rgb is not None:
+            return self._rgb.size
+        h, w = self._np.shape[:2]
+        return (w, h)
+
+    # --- memoised variants ---
+
+    def derive(self, key: Hashable, fn: Callable[["ImageContext"], Any]) -> Any:
+        """fn(self), computed once per key."""
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = fn(self)
+            return self._cache[key]
+
+    def rgba(self) -> Image.Image:
+        return self.derive("rgba", lambda c: c.rgb.convert("RGBA"))
+
+    def crop(self, box: Tuple[int, int, int, int]) -> "ImageContext":
+        """Context over the (x0, y0, x1, y1) window, sharing this one's pixels (array view)."""
+        x0, y0, x1, y1 = map(int, box)
+        return ImageContext(self.rgb_np[y0:y1, x0:x1])
+
+    def release(self, *keys: Hashable) -> None:
+        """Drops memoised variants (all of them without *keys*)."""
+        with self._lock:
+            if keys:
+                for k in keys:
+                    self._cache.pop(k, None)
+            else:
+                self._cache.clear()
+
+    def __repr__(self) -> str:
+        return f"ImageContext(size={self.size}, variants={list(self._cache)})"
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    view = arr.view()
+    view.flags.writeable = False
+    return view
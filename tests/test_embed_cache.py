@@ -0,0 +1,48 @@
+# tests/test_embed_cache.py
+import os
+import time
+
+import numpy as np
+from src.grounding.embed_cache import SamEmbeddingCache, get_embedding_cache
+
+
+def _img(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (24, 32, 3), dtype=np.uint8)
+
+def test_key_depends_on_content_variant_and_size():
+    k = SamEmbeddingCache.key(_img(), "vit_b", 1024)
+    assert k == SamEmbeddingCache.key(_img().copy(), "vit_b", 1024)
+    assert k != SamEmbeddingCache.key(_img(1), "vit_b", 1024)
+    assert k != SamEmbeddingCache.key(_img(), "vit_h", 1024)
+    assert k != SamEmbeddingCache.key(_img(), "vit_b", 512)
+
+def test_put_get_roundtrip(tmp_path):
+    cache = SamEmbeddingCache(tmp_path)
+    feats = np.random.default_rng(0).random((1, 8, 4, 4)).astype(np.float32)
+    key = SamEmbeddingCache.key(_img(), "vit_b", 1024)
+    assert cache.get(key) is None
+    cache.put(key, feats)
+    got = cache.get(key)
+    assert np.array_equal(got, feats) and not got.flags.writeable  # read-only memory map
+    assert cache.stats() == {"hits": 1, "misses": 1}
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_lru_eviction_by_mtime(tmp_path):
+    feats = np.zeros((1, 64, 16, 16), dtype=np.float32)
+    probe = SamEmbeddingCache(tmp_path)
+    probe.put("probe", feats)
+    size = os.path.getsize(tmp_path / "probe.npy")
+    os.remove(tmp_path / "probe.npy")
+
+    cache = SamEmbeddingCache(tmp_path, max_bytes=2 * size)
+    cache.put("a", feats)
+    cache.put("b", feats)
+    past = time.time() - 100
+    os.utime(tmp_path / "a.npy", (past, past))
+    os.utime(tmp_path / "b.npy", (past + 50, past + 50))
+    assert cache.get("a") is not None  # a hit refreshes a
+    cache.put("c", feats)
+    assert sorted(p.stem for p in tmp_path.glob("*.npy")) == ["a", "c"]
+
+def test_disabled_without_dir():
+    assert get_embedding_cache("", 2048) is None
@@ -0,0 +1,34 @@
+# tests/test_exec_plan.py
+from src.planners.schema import Plan, Target, Relation, Operation
+from src.grounding.exec_plan import build_execution_plan
+
+
+def _plan(names, ops=(), relations=()):
+    return Plan(instruction="-", targets=[Target(name=n) for n in names],
+                ops=[Operation(type=t, target=n) for t, n in ops],
+                relations=[Relation(subj=s, rel=r, obj=o) for s, r, o in relations])
+
+def test_add_detects_only_references():
+    ep = build_execution_plan(_plan(["car", "truck", "tree"], [("add", "car")], [("car", "next_to", "truck")]))
+    assert ep.detect == [1]
+    assert set(ep.skipped) == {0, 2}
+    assert "added" in ep.skipped[0] and "not needed" in ep.skipped[2]
+
+def test_add_without_relations_detects_every_other_target():
+    ep = build_execution_plan(_plan(["car", "truck", "tree"], [("add", "car")]))
+    assert ep.detect == [1, 2] and list(ep.skipped) == [0]
+
+def test_edit_detects_target_and_relation_partners():
+    ep = build_execution_plan(_plan(["dog", "car", "tree"], [("remove", "dog")], [("dog", "left_of", "car")]))
+    assert ep.detect == [0, 1] and list(ep.skipped) == [2]
+
+def test_no_ops_or_unknown_op_detects_everything():
+    assert build_execution_plan(_plan(["dog", "car"])).detect == [0, 1]
+    ep = build_execution_plan(_plan(["dog", "car"], [("unknown", "dog")]))
+    assert ep.detect == [0, 1] and not ep.skipped
+
+def test_to_meta_names_targets():
+    plan = _plan(["car", "truck"], [("add", "car")], [("car", "left_of", "truck")])
+    meta = build_execution_plan(plan).to_meta(plan)
+    assert meta["detect"] == ["truck"]
+    assert meta["skipped"][0]["name"] == "car"
@@ -0,0 +1,55 @@
+# tests/test_masks.py
+import numpy as np
+from src.grounding.masks import RLEMask, MaskList, grounding_to_json, grounding_from_json
+
+
+def _random_masks(n=6, shape=(37, 53), seed=0):
+    rng = np.random.default_rng(seed)
+    masks = rng.random((n,) + shape) > 0.6
+    masks[0] = False           # empty
+    masks[1] = True            # full
+    masks[2, 5:20, 40:53] = True
+    return masks
+
+def test_rle_roundtrip_and_measures():
+    for m in _random_masks():
+        r = RLEMask.encode(m)
+        assert np.array_equal(r.decode(), m)
+        assert r.area() == int(m.sum())
+        if m.any():
+            ys, xs = np.nonzero(m)
+            assert r.bbox() == (xs.min(), ys.min(), xs.max(), ys.max())
+        else:
+            assert r.bbox() is None
+        assert np.array_equal((~r).decode(), ~m)
+
+def test_rle_boolean_ops_match_dense():
+    masks = _random_masks()
+    for a in masks:
+        for b in masks:
+            ra, rb = RLEMask.encode(a), RLEMask.encode(b)
+            assert np.array_equal((ra & rb).decode(), a & b)
+            assert np.array_equal((ra | rb).decode(), a | b)
+            union = (a | b).sum()
+            expected = (a & b).sum() / union if union else 0.0
+            assert abs(ra.iou(rb) - expected) < 1e-9
+
+def test_masklist_json_roundtrip():
+    masks = _random_masks()
+    ml = MaskList.from_dense(masks)
+    assert ml.shape == masks.shape
+    assert np.array_equal(ml[2], masks[2])
+    g = {"meta": {"fallback": False}, "targets": [{"name": "car", "boxes": [], "masks": ml},
+                                                  {"name": "truck", "boxes": [], "masks": None}]}
+    back = grounding_from_json(grounding_to_json(g))
+    assert np.array_equal(back["targets"][0]["masks"].to_dense(), masks)
+    assert back["targets"][1]["masks"] is None
+
+def test_lazy_json_keeps_read_prefix():
+    masks = _random_masks()
+    d = {"format": "rle", "lazy": True,
+         "masks": [RLEMask.encode(masks[0]).to_json(), RLEMask.encode(masks[2]).to_json(), None,
+                   RLEMask.encode(masks[3]).to_json()]}
+    back = MaskList.from_json(d)
+    assert len(back) == 2  # stops at the first unread mask: masks[i] still matches boxes[i]
+    assert np.array_equal(back[1], masks[2])
@@ -0,0 +1,49 @@
+# tests/test_nms.py
+import numpy as np
+import pytest
+from src.grounding.nms import batched_nms_xyxy, nms_xyxy
+
+
+def _iou(a, b):
+    iw = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    ih = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def _greedy(boxes, scores, idxs, thr):
+    """Reference: highest score first, suppress same-class boxes above *thr* IoU."""
+    keep = []
+    for i in sorted(range(len(boxes)), key=lambda i: -scores[i]):
+        if all(idxs[k] != idxs[i] or _iou(boxes[k], boxes[i]) <= thr for k in keep):
+            keep.append(i)
+    return keep
+
+def _random(n, n_classes, seed):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 500, (n, 2))
+    boxes = np.concatenate([xy, xy + rng.uniform(10, 150, (n, 2))], axis=1).astype(np.float32)
+    return boxes, rng.random(n).astype(np.float32), rng.integers(0, n_classes, n)
+
+@pytest.mark.parametrize("n, n_classes, seed", [(1, 1, 0), (20, 1, 1), (60, 3, 2), (200, 5, 3)])
+def test_numpy_matches_greedy_reference(n, n_classes, seed):
+    boxes, scores, idxs = _random(n, n_classes, seed)
+    for thr in (0.3, 0.5, 0.7):
+        keep = batched_nms_xyxy(boxes, scores, idxs, thr, backend="numpy")
+        assert keep == _greedy(boxes, scores, idxs, thr)
+
+def test_class_aware():
+    boxes = np.array([[0, 0, 100, 100], [1, 1, 101, 101], [2, 2, 102, 102]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+    assert batched_nms_xyxy(boxes, scores, np.array([0, 0, 1]), 0.5, backend="numpy") == [0, 2]
+    assert nms_xyxy(boxes, scores, 0.5) == [0]
+
+def test_empty_input():
+    assert batched_nms_xyxy(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64), 0.5) == []
+    assert nms_xyxy([], [], 0.5) == []
+
+def test_torch_backend_matches_numpy():
+    pytest.importorskip("torchvision")
+    boxes, scores, idxs = _random(600, 3, 4)
+    assert (sorted(batched_nms_xyxy(boxes, scores, idxs, 0.5, backend="torch"))
+            == sorted(batched_nms_xyxy(boxes, scores, idxs, 0.5, backend="numpy")))
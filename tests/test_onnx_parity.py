@@ -0,0 +1,54 @@
+# tests/test_onnx_parity.py
+import os
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from src.grounding.onnx_backend import (
+    export_sam, export_dino, make_session, OrtImageEncoder, OrtMaskDecoder, OnnxGroundingDINO,
+)
+
+
+def test_sam_encoder_decoder_parity(tmp_path):
+    sam_registry = pytest.importorskip("segment_anything").sam_model_registry
+    torch.manual_seed(0)
+    sam = sam_registry["vit_b"](checkpoint=None).eval()  # random weights: parity, not quality
+    export_sam(sam, tmp_path / "enc.onnx", tmp_path / "dec.onnx")
+    encoder = OrtImageEncoder(make_session(tmp_path / "enc.onnx"), sam.image_encoder.img_size)
+    decoder = OrtMaskDecoder(make_session(tmp_path / "dec.onnx"))
+
+    with torch.no_grad():
+        x = torch.randn(1, 3, 1024, 1024)
+        emb = sam.image_encoder(x)
+        np.testing.assert_allclose(encoder(x).numpy(), emb.numpy(), rtol=1e-3, atol=1e-3)
+
+        boxes = torch.tensor([[10.0, 20.0, 300.0, 400.0], [500.0, 100.0, 900.0, 700.0]])
+        sparse, dense = sam.prompt_encoder(points=None, boxes=boxes, masks=None)
+        pe = sam.prompt_encoder.get_dense_pe()
+        for ref, got in zip(sam.mask_decoder(emb, pe, sparse, dense, False), decoder(emb, pe, sparse, dense, False)):
+            np.testing.assert_allclose(got.numpy(), ref.numpy(), rtol=1e-3, atol=1e-3)
+
+
+def test_groundingdino_parity(tmp_path):
+    yaml = pytest.importorskip("yaml")
+    from src.grounding.models import load_grounding_cfg, try_load_groundingdino
+    gcfg = load_grounding_cfg(yaml.safe_load(open("configs/grounding.yaml", encoding="utf-8")))
+    if not (os.path.isfile(gcfg.dino.config) and os.path.isfile(gcfg.dino.ckpt)):
+        pytest.skip("GroundingDINO config / checkpoint not available")
+    model, err = try_load_groundingdino(gcfg.dino, "cpu")
+    assert model is not None, err
+
+    path = export_dino(model, model.tokenizer, tmp_path / "dino.onnx", model.max_text_len)
+    onnx_model = OnnxGroundingDINO(make_session(path), model.tokenizer, model.max_text_len)
+    torch.manual_seed(0)
+    image = torch.randn(3, 640, 960)  # not the export size: dynamic axes
+    caption = "a red car . a person ."
+    with torch.no_grad():
+        ref = model(image[None], captions=[caption])
+    got = onnx_model(image[None], captions=[caption])
+    finite = torch.isfinite(ref["pred_logits"])
+    np.testing.assert_allclose(got["pred_logits"][finite].numpy(), ref["pred_logits"][finite].numpy(), atol=1e-2)
+    np.testing.assert_allclose(got["pred_boxes"].numpy(), ref["pred_boxes"].numpy(), atol=1e-3)
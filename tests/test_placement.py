@@ -0,0 +1,62 @@
+# tests/test_placement.py
+import numpy as np
+from src.editors.placement import placement_boxes, placement_mask
+
+SIZE = (1000, 800)  # (W, H)
+
+
+def _inside(b, size=SIZE):
+    W, H = size
+    return 0 <= b[0] < b[2] <= W and 0 <= b[1] < b[3] <= H
+
+def test_sides_and_count():
+    ref = (400, 300, 500, 400)
+    left = placement_boxes("left_of", ref, 2, SIZE)
+    right = placement_boxes("right_of", ref, 2, SIZE)
+    assert len(left) == len(right) == 2
+    assert all(b[2] <= ref[0] for b in left)
+    assert all(b[0] >= ref[2] for b in right)
+    assert all(b[3] == ref[3] for b in left + right)  # same ground line
+    assert all(b[2] - b[0] == 100 and b[3] - b[1] == 100 for b in left + right)
+
+def test_vertical_and_depth():
+    ref = (400, 300, 500, 400)
+    assert all(b[3] <= ref[1] for b in placement_boxes("above", ref, 1, SIZE))
+    assert all(b[1] >= ref[3] for b in placement_boxes("below", ref, 1, SIZE))
+    front = placement_boxes("in_front_of", ref, 1, SIZE)[0]
+    back = placement_boxes("behind", ref, 1, SIZE)[0]
+    assert front[2] - front[0] > 100 > back[2] - back[0]
+
+def test_clipped_instances_move_instead_of_vanishing():
+    boxes = placement_boxes("left_of", (100, 100, 200, 200), 2, SIZE)
+    assert len(boxes) == 2 and all(_inside(b) for b in boxes)
+    assert boxes[1][0] >= 200  # the one with no room on the left went right
+    boxes = placement_boxes("right_of", (850, 100, 950, 200), 3, SIZE)
+    assert len(boxes) == 3 and all(b[2] <= 850 for b in boxes)
+    boxes = placement_boxes("left_of", (300, 600, 700, 700), 4, SIZE)  # one slot per side: stacked rows
+    assert len(boxes) == 4 and all(_inside(b) for b in boxes)
+    assert sorted({b[3] for b in boxes}) == [580, 700]  # next row up: box height + gap
+
+def test_overflow_rows_never_cover_the_reference():
+    ref = (100, 100, 900, 200)  # as wide as the frame allows: one instance per row
+    boxes = placement_boxes("below", ref, 3, SIZE)
+    assert len(boxes) == 3
+    assert not any(_overlap(b, ref) for b in boxes)
+    assert [b[3] for b in boxes] == sorted(b[3] for b in boxes)  # rows stack downward
+    front = placement_boxes("in_front_of", ref, 3, SIZE)
+    assert len(front) == 3 and all(b[1] >= front[0][3] for b in front[1:])
+
+def _overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def test_no_room_and_no_reference():
+    assert placement_boxes("left_of", (0, 0, 1000, 800), 2, SIZE) == []
+    b = placement_boxes(None, None, 1, (900, 600), scale=0.5)[0]
+    assert (b[2] - b[0], b[3] - b[1]) == (100, 100)  # min side / 3, scaled once
+
+def test_mask_excludes_reference():
+    ref = np.zeros((800, 1000), dtype=bool)
+    ref[300:400, 400:500] = True
+    m = placement_mask([(350, 300, 450, 400)], SIZE, exclude=ref)
+    assert m.shape == (800, 1000)
+    assert m.sum() == 50 * 100 and not (m & ref).any()
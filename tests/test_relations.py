@@ -0,0 +1,64 @@
+# tests/test_relations.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from src.grounding.relations import relation_scores, prune_by_relations
+
+LEFT = [[0, 100, 100, 200]]
+RIGHT = [[300, 100, 400, 200]]
+TOP = [[150, 0, 250, 100]]
+BOTTOM = [[150, 300, 250, 400]]
+
+
+@pytest.mark.parametrize("rel, subj, obj", [
+    ("left_of", LEFT, RIGHT),
+    ("right_of", RIGHT, LEFT),
+    ("above", TOP, BOTTOM),
+    ("below", BOTTOM, TOP),
+    ("in_front_of", BOTTOM, TOP),   # lower bottom edge = closer to the camera
+    ("behind", TOP, BOTTOM),
+])
+def test_directional_relations(rel, subj, obj):
+    assert relation_scores(rel, np.array(subj), np.array(obj))[0, 0] > 0.5
+    assert relation_scores(rel, np.array(obj), np.array(subj))[0, 0] < 0.5
+
+def test_next_to_decays_with_distance():
+    near = relation_scores("next_to", np.array(LEFT), np.array([[110, 100, 210, 200]]))[0, 0]
+    far = relation_scores("next_to", np.array(LEFT), np.array([[800, 100, 900, 200]]))[0, 0]
+    assert near > 0.9 and far < 0.5
+
+def test_scores_shape_and_unknown_relation():
+    s = relation_scores("left_of", np.array(LEFT + RIGHT), np.array(RIGHT + LEFT + TOP))
+    assert s.shape == (2, 3) and ((s >= 0) & (s <= 1)).all()
+    with pytest.raises(ValueError):
+        relation_scores("inside", np.array(LEFT), np.array(RIGHT))
+
+
+def _targets():
+    return [{"name": "dog", "boxes": [LEFT[0], RIGHT[0]]}, {"name": "car", "boxes": [[600, 100, 700, 200]]}]
+
+def test_prune_keeps_boxes_that_satisfy_the_relation():
+    rel = [SimpleNamespace(subj="dog", rel="left_of", obj="car")]
+    keep, decisions = prune_by_relations(rel, _targets(), prunable=[0, 1])
+    assert keep[0].tolist() == [0, 1] and keep[1].tolist() == [0]
+    rel = [SimpleNamespace(subj="dog", rel="right_of", obj="car"), SimpleNamespace(subj="dog", rel="next_to", obj="car")]
+    targets = _targets()
+    targets[1]["boxes"] = [[150, 100, 250, 200]]  # between the two dogs
+    keep, decisions = prune_by_relations(rel, targets, prunable=[0])
+    assert keep[0].tolist() == [1] and decisions[0]["dropped"] == {"dog": 1, "car": 0}
+
+def test_prune_never_empties_a_side():
+    rel = [SimpleNamespace(subj="dog", rel="right_of", obj="car")]  # no dog is right of the car
+    keep, decisions = prune_by_relations(rel, _targets(), prunable=[0, 1])
+    assert keep[0].tolist() == [0, 1] and keep[1].tolist() == [0]
+    assert decisions[0]["applied"] is False
+
+def test_prune_respects_prunable_and_missing_targets():
+    rel = [SimpleNamespace(subj="car", rel="left_of", obj="dog"), SimpleNamespace(subj="cat", rel="left_of", obj="dog")]
+    targets = _targets()
+    targets[0]["boxes"].append([900, 100, 990, 200])
+    keep, decisions = prune_by_relations(rel, targets, prunable=[1])  # only the car may lose boxes
+    assert keep[0].tolist() == [0, 1, 2] and keep[1].tolist() == [0]
+    assert decisions[1] == {"subj": "cat", "rel": "left_of", "obj": "dog", "applied": False,
+                            "reason": "target not grounded"}
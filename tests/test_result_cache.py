@@ -0,0 +1,64 @@
+# tests/test_result_cache.py
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from src.grounding.masks import MaskList
+from src.grounding.result_cache import GroundingResultCache
+
+
+def _entry(seed=0):
+    masks = np.random.default_rng(seed).random((2, 20, 30)) > 0.5
+    return [[1, 2, 10, 12], [5, 5, 25, 18]], [0.9, 0.4], MaskList.from_dense(masks), masks
+
+def _gcfg(**dino):
+    d = dict(box_threshold=0.25, text_threshold=0.25, nms_iou=0.5, max_detections_per_target=3,
+             single_pass=False, ckpt="dino.pth")
+    d.update(dino)
+    sam = SimpleNamespace(variant="vit_b", ckpt="sam.pth", backends=[], policy=SimpleNamespace(enabled=False))
+    return SimpleNamespace(dino=SimpleNamespace(**d), sam=sam, tiling=SimpleNamespace(tile=1024, overlap=256))
+
+def test_key_depends_on_prompt_thresholds_and_context():
+    k = GroundingResultCache.key("img", "Red  car", _gcfg())
+    assert k == GroundingResultCache.key("img", "red car", _gcfg())
+    assert k != GroundingResultCache.key("img", "blue car", _gcfg())
+    assert k != GroundingResultCache.key("img", "red car", _gcfg(box_threshold=0.3))
+    assert k != GroundingResultCache.key("img", "red car", _gcfg(), context=["red car . truck ."])
+
+def test_memory_hit_returns_copies():
+    cache = GroundingResultCache(mem_items=4)
+    boxes, scores, ml, masks = _entry()
+    cache.put("k", boxes, scores, ml)
+    boxes.append([0, 0, 1, 1])  # the caller's objects are not the cached ones
+    hit = cache.get("k")
+    assert len(hit["boxes"]) == 2 and np.array_equal(hit["masks"].to_dense(), masks)
+    hit["boxes"].clear()
+    hit["masks"].rles.clear()
+    again = cache.get("k")
+    assert len(again["boxes"]) == 2 and len(again["masks"]) == 2
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"]["memory"] == 2 and cache.stats()["misses"] == 1
+
+def test_memory_lru_eviction():
+    cache = GroundingResultCache(mem_items=2)
+    for k in "abc":
+        cache.put(k, [], [], None)
+    assert cache.get("a") is None and cache.get("c") is not None
+
+def test_disk_reload_and_eviction(tmp_path):
+    boxes, scores, ml, masks = _entry()
+    GroundingResultCache(cache_dir=str(tmp_path)).put("k", boxes, scores, ml)
+    fresh = GroundingResultCache(cache_dir=str(tmp_path))  # new process: memory level empty
+    hit = fresh.get("k")
+    assert hit["boxes"] == boxes and hit["scores"] == scores
+    assert np.array_equal(hit["masks"].to_dense(), masks)
+    assert fresh.stats()["hits"]["disk"] == 1
+
+    size = os.path.getsize(tmp_path / "k.json")
+    small = GroundingResultCache(mem_items=0, cache_dir=str(tmp_path), max_bytes=2 * size)
+    past = time.time() - 100
+    os.utime(tmp_path / "k.json", (past, past))  # oldest
+    small.put("k2", boxes, scores, ml)
+    small.put("k3", boxes, scores, ml)
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == ["k2.json", "k3.json"]
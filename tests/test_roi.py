@@ -0,0 +1,36 @@
+# tests/test_roi.py
+import numpy as np
+from PIL import Image
+from src.editors.roi import roi_window, feather, paste_back
+
+
+def _scene(shape=(300, 400), seed=0):
+    rng = np.random.default_rng(seed)
+    original = rng.integers(0, 256, shape + (3,), dtype=np.uint8)
+    mask = np.zeros(shape, dtype=bool)
+    mask[120:160, 200:260] = True
+    return original, mask
+
+def test_window_contains_mask_and_fits_image():
+    _, mask = _scene()
+    x0, y0, x1, y1 = roi_window(mask, pad=0.25, min_side=128, multiple=8)
+    assert 0 <= x0 and 0 <= y0 and x1 <= 400 and y1 <= 300
+    assert x0 <= 200 and x1 >= 260 and y0 <= 120 and y1 >= 160
+    assert (x1 - x0) % 8 == 0 and (y1 - y0) % 8 == 0
+    assert min(x1 - x0, y1 - y0) >= 128
+    assert roi_window(np.zeros((10, 10), dtype=bool)) is None
+
+def test_paste_back_leaves_untouched_pixels_bit_exact():
+    original, mask = _scene()
+    window = roi_window(mask, pad=0.25, min_side=128)
+    x0, y0, x1, y1 = window
+    crop_mask = mask[y0:y1, x0:x1]
+    alpha = feather(crop_mask, 4)
+    edited = Image.fromarray(np.full((y1 - y0, x1 - x0, 3), 7, dtype=np.uint8))
+    out = np.asarray(paste_back(original, edited, window, alpha))
+
+    touched = np.zeros(mask.shape, dtype=bool)
+    touched[y0:y1, x0:x1] = alpha > 0
+    assert np.array_equal(out[~touched], original[~touched])
+    assert (out[128:152, 208:252] == 7).all()  # alpha is exactly 1 deep inside the mask
+    assert not touched[:, :150].any()  # nothing beyond ~2x the feather radius
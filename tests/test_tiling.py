@@ -0,0 +1,41 @@
+# tests/test_tiling.py
+import numpy as np
+import pytest
+from src.grounding.tiling import iter_tiles, assign_windows, contains, to_image_coords
+from src.grounding.nms import batched_nms_xyxy
+
+
+@pytest.mark.parametrize("W, H", [(3000, 2000), (2048, 1024), (1000, 700), (1025, 4097)])
+def test_tiles_cover_image_with_overlap(W, H):
+    tile, overlap = 1024, 256
+    tiles = list(iter_tiles(W, H, tile, overlap))
+    covered = np.zeros((H, W), dtype=np.int32)
+    for x0, y0, x1, y1 in tiles:
+        assert 0 <= x0 < x1 <= W and 0 <= y0 < y1 <= H
+        assert x1 - x0 == min(tile, W) and y1 - y0 == min(tile, H)  # border tiles stay full size
+        covered[y0:y1, x0:x1] += 1
+    assert covered.min() >= 1
+    xs = sorted({t[0] for t in tiles})
+    for a, b in zip(xs, xs[1:]):  # neighbours share at least *overlap* pixels
+        assert a + tile - b >= overlap
+
+def test_back_projection_and_cross_tile_merge():
+    W, H = 2000, 1000
+    obj = np.array([900.0, 300.0, 1000.0, 400.0])  # lies in the overlap of the first two tiles
+    tiles = [t for t in iter_tiles(W, H, 1024, 256) if contains(t, obj)]
+    assert len(tiles) >= 2
+    per_tile = [to_image_coords(obj - np.array([t[0], t[1], t[0], t[1]]) + k, t) for k, t in enumerate(tiles)]
+    assert np.allclose(per_tile[0], obj)
+    boxes = np.concatenate(per_tile)
+    keep = batched_nms_xyxy(boxes, np.linspace(0.9, 0.5, len(boxes)), np.zeros(len(boxes), dtype=np.int64), 0.5)
+    assert keep == [0]  # duplicates from overlapping tiles collapse to one detection
+
+def test_assign_windows_groups_boxes():
+    W, H = 3000, 2000
+    boxes = [[10, 10, 50, 50], [100, 100, 200, 200], [2900, 1900, 2990, 1990], [0, 0, 1500, 300]]
+    windows, owner = assign_windows(boxes, W, H, 1024, 256)
+    assert owner[0] == owner[1] != owner[2]
+    for b, i in zip(boxes, owner):
+        assert contains(windows[i], b)
+    x0, y0, x1, y1 = windows[owner[3]]
+    assert x1 - x0 > 1024  # box wider than a tile gets a window around it